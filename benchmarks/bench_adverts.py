@@ -0,0 +1,68 @@
+# A storm of BLE advertisements: mesh nodes with a noisy signal, mixed with
+# devices from outside the mesh. Reports advertisements handled per second
+# and how often hardware listeners were called, with RSSI updates throttled
+# and with every advertisement published as before.
+#
+#   python benchmarks/bench_adverts.py
+
+import random
+import time
+
+from common import make_manager, report, run
+
+from fake_ble import FakeBLEDevice
+
+from pyplejd import DeviceTypes as dt
+
+ADVERTS = 200_000
+FOREIGN = 200
+
+
+def storm(manager) -> list:
+    rng = random.Random(1)
+    nodes = [
+        FakeBLEDevice(":".join(a[i : i + 2] for i in range(0, 12, 2)))
+        for a in manager.hardware
+    ]
+    foreign = [
+        FakeBLEDevice(":".join(f"{rng.randrange(256):02X}" for _ in range(6)))
+        for _ in range(FOREIGN)
+    ]
+    adverts = []
+    for _ in range(ADVERTS):
+        if rng.random() < 0.5:
+            adverts.append((rng.choice(nodes), -60 + rng.randint(-2, 2)))
+        else:
+            adverts.append((rng.choice(foreign), rng.randint(-95, -50)))
+    return adverts
+
+
+async def flood(threshold: int):
+    manager = await make_manager()
+    dt.PlejdHardware.rssi_update_threshold = threshold
+    calls = 0
+
+    def listener():
+        nonlocal calls
+        calls += 1
+
+    for hw in manager.hardware.values():
+        hw.subscribe(listener)
+    adverts = storm(manager)
+
+    start = time.perf_counter()
+    for device, rssi in adverts:
+        manager.add_mesh_device(device, rssi)
+    elapsed = time.perf_counter() - start
+    return ADVERTS / elapsed, calls
+
+
+async def main():
+    for name, threshold in (("every advertisement", 0), ("throttled", 3)):
+        rate, calls = await flood(threshold)
+        report(f"{name}", rate, "adverts/s")
+        report(f"{name}, listener calls", calls, "")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,65 @@
+# Time to first command after a restart, without and with the mesh cache.
+# Advertisements trickle in, strongest node first, and the strongest node
+# can't be reached. The integration pings once its scan is done, and a
+# command issued at startup is held until the mesh is ready.
+#
+#   python benchmarks/bench_cold_start.py
+
+import asyncio
+import logging
+import os
+import tempfile
+
+from common import make_manager, report, run
+
+from fake_ble import FakeMesh, FakeBLEDevice
+
+import pyplejd.ble
+from pyplejd.ble import LastData, WRITE_HOLD
+
+ADVERT_INTERVAL = 0.3
+SCAN_TIME = 1.5
+UNREACHABLE = "00000000000A"
+
+
+async def start(cache_path: str) -> float:
+    manager = await make_manager(cache_path=cache_path)
+    mesh = manager.mesh
+    fake = FakeMesh(manager.cloud.cryptokey, latency=0.02, connect_delay=0.3)
+    fake.delays[UNREACHABLE] = 2.0
+    fake.failures.add(UNREACHABLE)
+    pyplejd.ble.establish_connection = fake.establish_connection
+    mesh.write_policy = WRITE_HOLD
+    mesh.write_wait_timeout = 30.0
+
+    async def advertise():
+        for i, address in enumerate(manager.hardware):
+            address = ":".join(address[j : j + 2] for j in range(0, 12, 2))
+            manager.add_mesh_device(FakeBLEDevice(address), -60 - i)
+            await asyncio.sleep(ADVERT_INTERVAL)
+
+    async def integration():
+        await asyncio.sleep(SCAN_TIME)
+        await manager.ping()
+
+    command = LastData(address=10, command=LastData.CMD_GROUP_OUTPUT_STATE, payload=[1])
+    await asyncio.gather(advertise(), integration(), mesh.write(command.to_bytes()))
+    elapsed = mesh.connection_stats["time_to_first_command"]
+    await manager.disconnect()
+    # Let the last cache write finish
+    while mesh._cache_save is not None:
+        await asyncio.sleep(0.01)
+    return elapsed
+
+
+async def main():
+    # The failed attempts are expected
+    logging.getLogger("pyplejd").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "mesh.json")
+        report("first start, no cache", await start(cache_path), "s")
+        report("restart with cache", await start(cache_path), "s")
+
+
+if __name__ == "__main__":
+    run(main())
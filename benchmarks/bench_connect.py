@@ -0,0 +1,42 @@
+# Time to a ready connection when the two strongest nodes are unreachable
+# and time out after 3 s, trying nodes one by one and racing three at a
+# time.
+#
+#   python benchmarks/bench_connect.py
+
+import logging
+
+from common import make_manager, report, run
+
+from fake_ble import FakeMesh, see_all
+
+import pyplejd.ble
+
+UNREACHABLE = ["00000000000A", "00000000000B"]
+
+
+async def connect_time(race: int) -> float:
+    manager = await make_manager()
+    mesh = manager.mesh
+    fake = FakeMesh(manager.cloud.cryptokey, latency=0.02, connect_delay=0.5)
+    for address in UNREACHABLE:
+        fake.delays[address] = 3.0
+        fake.failures.add(address)
+    pyplejd.ble.establish_connection = fake.establish_connection
+    mesh.connect_race = race
+    see_all(manager)
+    assert await mesh.connect()
+    elapsed = mesh.connection_stats["connect_time"]
+    await manager.disconnect()
+    return elapsed
+
+
+async def main():
+    # The failed attempts are expected
+    logging.getLogger("pyplejd").setLevel(logging.ERROR)
+    report("one node at a time", await connect_time(1), "s")
+    report("racing three nodes", await connect_time(3), "s")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,54 @@
+# Frames per second through the mesh cipher, for a typical 20 byte frame.
+#
+#   python benchmarks/bench_crypto.py
+
+import binascii
+import os
+import struct
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.backends import default_backend
+
+from common import rate, report
+
+from pyplejd.ble.crypto import CipherContext
+
+KEY = "0123456789abcdef0123456789abcdef"
+ADDRESS = "AA:BB:CC:DD:EE:FF"
+FRAME = os.urandom(20)
+N = 20_000
+
+
+def legacy_encrypt_decrypt(key: str, addr: str, data: bytearray) -> bytes:
+    # The original implementation: a new AES context and a byte by byte XOR
+    # for every frame
+    key = binascii.a2b_hex(key.replace("-", ""))
+    addr = binascii.a2b_hex(addr.replace("-", "").replace(":", ""))[::-1]
+    buf = addr + addr + addr[:4]
+    ct = Cipher(algorithms.AES(bytearray(key)), modes.ECB(), backend=default_backend())
+    ct = ct.encryptor()
+    ct = ct.update(buf)
+    output = b""
+    for i, d in enumerate(data):
+        output += struct.pack("B", d ^ ct[i % 16])
+    return output
+
+
+def main():
+    cipher = CipherContext(KEY, ADDRESS)
+    assert cipher.encrypt_decrypt(FRAME) == legacy_encrypt_decrypt(KEY, ADDRESS, FRAME)
+
+    report(
+        "per-call cipher (original)",
+        rate(lambda: legacy_encrypt_decrypt(KEY, ADDRESS, FRAME), N),
+        "frames/s",
+    )
+    report(
+        "CipherContext.encrypt_decrypt",
+        rate(lambda: cipher.encrypt_decrypt(FRAME), N),
+        "frames/s",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# LASTDATA frames per second under a burst of motion and color temperature
+# frames: decode the frame, then walk its mini-packages three times, as the
+# device parsers and their trace calls do.
+#
+#   python benchmarks/bench_lastdata.py
+
+from common import rate, report
+
+from pyplejd.ble.lastdata import LastData
+
+FRAMES = [
+    # Motion with battery, device type and lux
+    bytes.fromhex("1e011004200303" "1f07009c" "0f0846" "0601"),
+    # Color temperature
+    bytes.fromhex("0c01100420" "0308" "110fa0"),
+]
+N = 20_000
+
+
+class LegacyMiniPkg:
+    # The original list-backed mini-package
+    def __init__(self, dta):
+        self.flag = bool(int(dta[0]) & 0x80)
+        length = (int(dta[0]) & 0x70) >> 4
+        start = 1
+        self.type = int(dta[0]) & 0x0F
+        if self.type == 0x0F:
+            self.type += int(dta[1])
+            start = 2
+        self.payload = [int(i) for i in dta[start : start + length + 1]]
+
+    @property
+    def length(self):
+        return len(self.payload) + (2 if self.type > 0x0F else 1)
+
+
+class LegacyLastData:
+    # The original frame, with mini-packages decoded on every iteration
+    def __init__(self, dta):
+        self.address = int(dta[0])
+        self.command_type = int(dta[2])
+        self.command = int.from_bytes(dta[3:5], byteorder="big")
+        self.payload = dta[5:]
+
+    @property
+    def minipkgs(self):
+        offset = 0
+        while offset < len(self.payload):
+            pkg = LegacyMiniPkg(self.payload[offset:])
+            offset += pkg.length
+            yield pkg
+
+
+def burst(cls):
+    def handle():
+        for frame in FRAMES:
+            data = cls(frame)
+            for _ in range(3):
+                for p in data.minipkgs:
+                    p.type, p.payload
+
+    return handle
+
+
+def main():
+    report("original frame objects", rate(burst(LegacyLastData), N) * 2, "frames/s")
+    report("slotted, lazily decoded", rate(burst(LastData), N) * 2, "frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Decoding a full LIGHTLEVEL poll of a site with 250 outputs: the mesh sends
+# the records two at a time, and each record's state and dim level are read.
+#
+#   python benchmarks/bench_lightlevel.py
+
+import struct
+
+from common import rate, report
+
+from pyplejd.ble.lightlevel import parse_lightlevels
+
+OUTPUTS = 250
+RECORD = struct.Struct("<B?3xH3x")
+NOTIFICATIONS = [
+    b"".join(RECORD.pack(a, a % 2 == 0, a * 256) for a in (a, a + 1))
+    for a in range(1, OUTPUTS + 1, 2)
+]
+N = 200
+
+
+class LegacyLightLevel:
+    # The original per-record object
+    def __init__(self, data):
+        self.address = int(data[0])
+        self.state = bool(data[1])
+        self.dim = int.from_bytes(data[5:7], byteorder="little")
+        self.payload = [int(d) for d in data[5:]]
+
+
+def legacy_poll():
+    for data in NOTIFICATIONS:
+        for level in [LegacyLightLevel(data[i : i + 10]) for i in range(0, 20, 10)]:
+            level.address, level.state, level.dim / 256
+
+
+def poll():
+    for data in NOTIFICATIONS:
+        levels = parse_lightlevels(data)
+        states, dims = levels.states, levels.dims
+        for i, address in enumerate(levels.addresses):
+            address, states[i], dims[i] / 256
+
+
+def main():
+    report("one object per record (original)", rate(legacy_poll, N), "polls/s")
+    report("column-wise LightLevels", rate(poll, N), "polls/s")
+
+
+if __name__ == "__main__":
+    main()
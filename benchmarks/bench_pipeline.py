@@ -0,0 +1,51 @@
+# Switching off 20 lights one frame at a time through a simulated gateway
+# with 30 ms round trips, with acknowledged writes and pipelined with
+# different in-flight windows.
+#
+#   python benchmarks/bench_pipeline.py
+
+import asyncio
+import time
+
+from common import make_manager, report, run
+
+from fake_ble import FakeMesh, see_all
+
+import pyplejd.ble
+from pyplejd.ble import LastData
+
+LATENCY = 0.03
+FRAMES = [
+    LastData(address=a, command=LastData.CMD_GROUP_OUTPUT_STATE, payload=[0]).to_bytes()
+    for a in range(10, 30)
+]
+
+
+async def all_off(window: int) -> float:
+    manager = await make_manager()
+    mesh = manager.mesh
+    fake = FakeMesh(manager.cloud.cryptokey, latency=LATENCY)
+    pyplejd.ble.establish_connection = fake.establish_connection
+    mesh.pipeline_window = window
+    see_all(manager)
+    await mesh.connect()
+
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        assert await mesh.write(*FRAMES)
+        best = min(best, time.perf_counter() - start)
+        # Let the echoes of this round come back
+        await asyncio.sleep(2 * LATENCY)
+    await manager.disconnect()
+    return best
+
+
+async def main():
+    for window in (0, 4, 8):
+        name = "acknowledged" if window == 0 else f"pipelined, window {window}"
+        report(name, await all_off(window) * 1000, "ms")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,71 @@
+# Routing a full LIGHTLEVEL poll to the outputs of sites with 50, 500 and
+# 5,000 outputs, through the dispatch index and by scanning every device as
+# the original lightlevel_callback did.
+#
+# Mesh addresses are a single byte, so a real site has at most ~250 of
+# them. The larger synthetic sites reuse addresses, which keeps the number
+# of records per poll the same and shows how cost grows with the number of
+# devices.
+#
+#   python benchmarks/bench_routing.py
+
+import struct
+
+from common import arate, report, run
+
+from pyplejd import PlejdManager, DeviceTypes as dt
+from pyplejd.ble.lightlevel import parse_lightlevels
+
+RECORD = struct.Struct("<B?3xH3x")
+
+
+class Output(dt.PlejdOutput):
+    # Just enough of an output to be routed to
+    def __init__(self, address: int):
+        self.address = address
+        self.rxAddress = -1
+
+    async def parse_lightlevel(self, levels, index):
+        pass
+
+
+def site(outputs: int) -> PlejdManager:
+    manager = PlejdManager("user", "password", "site")
+    for i in range(outputs):
+        manager._add_device(Output(i % 250 + 1))
+    return manager
+
+
+def poll(outputs: int) -> list:
+    addresses = range(1, min(outputs, 250) + 1)
+    records = [RECORD.pack(a, True, 0) for a in addresses]
+    return [
+        parse_lightlevels(b"".join(records[i : i + 2]))
+        for i in range(0, len(records), 2)
+    ]
+
+
+async def main():
+    for outputs in (50, 500, 5_000):
+        manager = site(outputs)
+        notifications = poll(outputs)
+
+        async def indexed():
+            for levels in notifications:
+                await manager.lightlevel_callback(levels)
+
+        async def scan():
+            # The original routing
+            for levels in notifications:
+                for i, address in enumerate(levels.addresses):
+                    for d in manager.devices:
+                        if d.address == address:
+                            await d.parse_lightlevel(levels, i)
+
+        number = max(1, 20_000 // outputs)
+        report(f"{outputs} outputs, scan", await arate(scan, number), "polls/s")
+        report(f"{outputs} outputs, index", await arate(indexed, number), "polls/s")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,44 @@
+# Handling a LASTDATA notification (decrypt, decode, dispatch to a light)
+# with protocol tracing off, and with it on and written to a stream.
+#
+#   python benchmarks/bench_trace.py
+
+import io
+import logging
+
+from common import arate, make_manager, report, run
+
+from pyplejd.ble import LastData, MiniPkg
+from pyplejd.ble.crypto import CipherContext
+
+N = 5_000
+
+
+async def main():
+    manager = await make_manager()
+    mesh = manager.mesh
+    cipher = CipherContext(manager.cloud.cryptokey, "00:00:00:00:00:0A")
+    frame = LastData(
+        address=10,
+        command=LastData.CMD_OUTPUT_SET,
+        payload=[
+            MiniPkg(type=MiniPkg.TPE_SOURCE, payload=[MiniPkg.SRC_APP]),
+            MiniPkg(type=MiniPkg.TPE_WHITEBALANCE, payload=[0x0F, 0xA0]),
+        ],
+    ).to_bytes()
+    encrypted = cipher.encrypt_decrypt(frame)
+
+    async def handle():
+        await mesh._handle_lastdata(cipher, encrypted)
+
+    report("tracing off", await arate(handle, N), "frames/s")
+
+    trace = logging.getLogger("pyplejd.ble.device")
+    trace.setLevel(logging.DEBUG)
+    trace.propagate = False
+    trace.addHandler(logging.StreamHandler(io.StringIO()))
+    report("tracing on", await arate(handle, N), "frames/s")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import sys
+import time
+import timeit
+from pathlib import Path
+
+# Benchmarks run from a checkout, next to the tests they share fixtures and
+# the simulated mesh with
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "tests")]
+
+from pyplejd import PlejdManager, ConnectionError  # noqa: E402
+
+FIXTURES = ROOT / "tests" / "fixtures"
+
+
+def rate(func, number: int, repeat: int = 5) -> float:
+    # Calls per second, best of repeat runs
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return number / best
+
+
+async def arate(func, number: int, repeat: int = 5) -> float:
+    # Awaited calls per second, best of repeat runs
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        best = min(best, time.perf_counter() - start)
+    return number / best
+
+
+def report(name: str, value: float, unit: str):
+    print(f"{name:<40} {value:>12,.1f} {unit}")
+
+
+async def make_manager(site: dict = None, **kwargs) -> PlejdManager:
+    # A manager set up from a site dict instead of the cloud
+    if site is None:
+        with open(FIXTURES / "site.json", encoding="utf-8") as f:
+            site = json.load(f)
+    manager = PlejdManager("user", "password", site["site"]["siteId"], **kwargs)
+
+    async def offline():
+        raise ConnectionError
+
+    manager.cloud.get_details = offline
+    await manager.init(site)
+    return manager
+
+
+def run(coro):
+    return asyncio.run(coro)
@@ -1,10 +1,13 @@
 from __future__ import annotations
+import asyncio
 import logging
+import math
+import time
 from datetime import timedelta
 
 from bleak_retry_connector import close_stale_connections
 
-from .ble import PlejdMesh, PLEJD_SERVICE, LastData, LightLevel
+from .ble import PlejdMesh, PLEJD_SERVICE, LastData, LightLevels
 from .ble.debug import rec_log
 from .cloud import PlejdCloudSite
 
@@ -29,13 +32,17 @@ __all__ = [
 
 dt = DeviceTypes
 
+BROADCAST_ADDRESS = 0
+
 
 get_sites = PlejdCloudSite.get_sites
 verify_credentials = PlejdCloudSite.verify_credentials
 
 
 class PlejdManager:
-    def __init__(self, username: str, password: str, siteId: str):
+    def __init__(
+        self, username: str, password: str, siteId: str, cache_path: str = None
+    ):
         self.credentials = {
             "username": username,
             "password": password,
@@ -44,10 +51,23 @@ class PlejdManager:
 
         self.mesh = PlejdMesh(self)
         self.devices: list[dt.PlejdDevice | dt.PlejdScene] = []
+        self._dispatch: dict[int, list[dt.PlejdDevice]] = {}
+        self._scenes: dict[int, list[dt.PlejdScene]] = {}
+        self._buttons: dict[tuple[int, int], list[dt.PlejdButton]] = {}
+        self._groups: dict[int, set[dt.PlejdOutput]] = {}
+        # When each address last reported its state
+        self._heard: dict[int, float] = {}
+        # Share of stale outputs above which the whole mesh is polled instead
+        # of reading the stale outputs one by one
+        self.full_poll_share = 0.25
+        # Number of devices asked for their time at once
+        self.time_poll_concurrency = 4
         self.hardware: dict[str, dt.PlejdHardware] = {}
         self._blacklist = set()  # TODO: MAKE WORK
         self.cloud = PlejdCloudSite(**self.credentials)
         self.options = {}
+        # Optional file where what was learned about the mesh is kept
+        self.cache_path = cache_path
 
     @property
     def blacklist(self):
@@ -67,26 +87,145 @@ class PlejdManager:
             )
         return self.hardware[addr]
 
+    def _add_device(self, device: dt.PlejdDevice | dt.PlejdScene):
+        self.devices.append(device)
+        self._index_device(device)
+
+    def _index_device(self, device: dt.PlejdDevice | dt.PlejdScene):
+        # Scenes only care about scene frames and buttons about button events
+        # Outputs also care about frames sent to the broadcast address
+        if isinstance(device, dt.PlejdScene):
+            self._scenes.setdefault(device.index, []).append(device)
+            return
+        if isinstance(device, dt.PlejdButton):
+            key = (device.deviceAddress, device.button_id)
+            self._buttons.setdefault(key, []).append(device)
+
+        addresses = {a for a in (device.address, device.rxAddress) if a >= 0}
+        if isinstance(device, dt.PlejdOutput):
+            addresses.add(BROADCAST_ADDRESS)
+        for address in addresses:
+            self._dispatch.setdefault(address, []).append(device)
+
+    def _index_groups(self, device: dt.PlejdOutput):
+        # Group and room addresses which the output listens to
+        details = self.cloud.details
+        groups = details.outputGroups.get(device.plejdDevice.deviceId, {})
+        addresses = set(groups.get(str(device.settings.output), []))
+        if (room := details.roomAddress.get(device.deviceData.roomId)) is not None:
+            addresses.add(room)
+        for address in addresses:
+            self._groups.setdefault(address, set()).add(device)
+            # Frames sent to the group also tell the state of the member
+            if isinstance(device, (dt.PlejdLight, dt.PlejdRelay)):
+                self._dispatch.setdefault(address, []).append(device)
+
+    def room_outputs(self, roomId: str) -> list[dt.PlejdOutput]:
+        return [
+            d
+            for d in self.devices
+            if isinstance(d, dt.PlejdOutput) and d.deviceData.roomId == roomId
+        ]
+
+    def _bulk_frames(
+        self, devices: list[dt.PlejdOutput], command: int, payload: list[int]
+    ) -> list[bytearray]:
+        # Use one frame per group or room whose members are all targeted
+        # and one frame per device for the rest
+        remaining = set(devices)
+        frames = []
+        groups = sorted(self._groups.items(), key=lambda g: len(g[1]), reverse=True)
+        for address, members in groups:
+            if len(members) > 1 and members <= remaining:
+                frames.append(
+                    LastData(address=address, command=command, payload=payload)
+                )
+                remaining -= members
+        for d in sorted(remaining, key=lambda d: d.address):
+            frames.append(LastData(address=d.address, command=command, payload=payload))
+        return [f.to_bytes() for f in frames]
+
+    async def bulk_turn_on(self, devices: list[dt.PlejdOutput], dim: int = None):
+        devices = [d for d in devices if isinstance(d, (dt.PlejdLight, dt.PlejdRelay))]
+        if dim is None:
+            frames = self._bulk_frames(devices, LastData.CMD_GROUP_OUTPUT_STATE, [0x1])
+        else:
+            dim = int(dim)
+            lights = [d for d in devices if isinstance(d, dt.PlejdLight)]
+            relays = [d for d in devices if not isinstance(d, dt.PlejdLight)]
+            frames = self._bulk_frames(
+                lights, LastData.CMD_GROUP_OUTPUT_STATE_AND_LEVEL, [0x1, dim, dim]
+            ) + self._bulk_frames(relays, LastData.CMD_GROUP_OUTPUT_STATE, [0x1])
+        if frames:
+            await self.mesh.write(*frames)
+
+    async def bulk_turn_off(self, devices: list[dt.PlejdOutput]):
+        devices = [d for d in devices if isinstance(d, (dt.PlejdLight, dt.PlejdRelay))]
+        frames = self._bulk_frames(devices, LastData.CMD_GROUP_OUTPUT_STATE, [0x0])
+        if frames:
+            await self.mesh.write(*frames)
+
+    async def refresh(self, devices: list[dt.PlejdOutput] = None, max_age=None):
+        # Refresh the state of outputs which haven't reported it in max_age
+        # seconds, by default the full poll interval of the mesh
+        outputs = [d for d in self.devices if isinstance(d, dt.PlejdOutput)]
+        if devices is None:
+            devices = outputs
+        if max_age is None:
+            max_age = self.mesh.full_poll_interval
+        now = time.monotonic()
+        heard = self._heard
+        stale = sorted(
+            {
+                d.address
+                for d in devices
+                if now - heard.get(d.address, -math.inf) >= max_age
+            }
+        )
+        if not stale:
+            return
+        if len(stale) > self.full_poll_share * len({d.address for d in outputs}):
+            await self.mesh.poll()
+        else:
+            await self.mesh.read_state(*stale)
+
     def connect_callback(self, connected: bool):
         for d in self.devices:
             d.set_available(connected)
 
-    async def lightlevel_callback(self, lightlevels: list[LightLevel]):
-        for ll in lightlevels:
-            for d in self.devices:
-                if ll.address == d.address:
-                    await d.parse_lightlevel(ll)
+    async def lightlevel_callback(self, lightlevels: LightLevels):
+        dispatch = self._dispatch
+        heard = self._heard
+        now = time.monotonic()
+        for i, address in enumerate(lightlevels.addresses):
+            if not (devices := dispatch.get(address)):
+                continue
+            heard[address] = now
+            for d in devices:
+                if d.address == address:
+                    await d.parse_lightlevel(lightlevels, i)
 
     async def lastdata_callback(self, data: LastData):
-        found = False
-        for d in self.devices:
-            if data.address in [d.address, d.rxAddress, 0]:
-                found = True
-                await d.parse_lastdata(data)
-
-        if not found:
-            rec_log(f"Unknown command received: {data.command}")
-            rec_log(f"    {data.hex}")
+        match data.command:
+            case LastData.CMD_SCENE if data.payload:
+                devices = self._scenes.get(data.payload[0])
+            case LastData.CMD_EVENT_FIRED if len(data.payload) >= 2:
+                devices = self._buttons.get((data.payload[0], data.payload[1]))
+            case _:
+                devices = self._dispatch.get(data.address)
+                if devices and data.address != BROADCAST_ADDRESS:
+                    # For group and room frames, every member reported its state
+                    now = time.monotonic()
+                    heard = self._heard
+                    for d in devices:
+                        heard[d.address] = now
+
+        for d in devices or ():
+            await d.parse_lastdata(data)
+
+        if not devices:
+            rec_log(lambda: f"Unknown command received: {data.command}")
+            rec_log(lambda: f"    {data.hex}")
 
     async def init(self, sitedata=None):
         await self.cloud.load_site_details(sitedata)
@@ -100,7 +239,9 @@ class PlejdManager:
             cls = outputDeviceClass(device)
             dev = cls(**device, mesh=self.mesh)
             LOGGER.debug(dev)
-            self.devices.append(dev)
+            self._add_device(dev)
+            if isinstance(dev, dt.PlejdOutput):
+                self._index_groups(dev)
 
             hw = self._get_hw(dev.BLEaddress, dev)
             hw.devices.add(dev)
@@ -113,7 +254,7 @@ class PlejdManager:
             cls = inputDeviceClass(device)
             dev = cls(**device, mesh=self.mesh)
             LOGGER.debug(dev)
-            self.devices.append(dev)
+            self._add_device(dev)
 
             hw = self._get_hw(dev.BLEaddress, dev)
             hw.devices.add(dev)
@@ -126,7 +267,10 @@ class PlejdManager:
             cls = sceneDeviceClass(scene)
             scn = cls(**scene, mesh=self.mesh)
             LOGGER.debug(scn)
-            self.devices.append(scn)
+            self._add_device(scn)
+
+        if self.cache_path:
+            await self.mesh.load_cache(self.cache_path)
 
     def add_mesh_device(self, device, rssi) -> bool:
         return self.mesh.see_device(device, rssi)
@@ -147,18 +291,38 @@ class PlejdManager:
 
     @property
     def ping_interval(self):
+        # A fixed cadence for callers which schedule ping once
         return timedelta(minutes=10)
 
+    @property
+    def keepalive_interval(self):
+        # When to ping next. This adapts to mesh traffic and failures, so
+        # re-read it after every ping.
+        return timedelta(seconds=self.mesh.keepalive_interval)
+
     async def ping(self):
         retval = await self.mesh.ping()
         return retval
 
     async def broadcast_time(self):
-        for d in self.devices:
-            if d.powered:
-                if await self.mesh.poll_time(d.address):
+        # Ask devices for their time a few at a time, and set the time as
+        # soon as one of them has it wrong
+        slots = asyncio.Semaphore(self.time_poll_concurrency)
+
+        async def poll_time(address: int):
+            async with slots:
+                return await self.mesh.poll_time(address)
+
+        addresses = sorted({d.address for d in self.devices if d.powered})
+        tasks = [asyncio.create_task(poll_time(a)) for a in addresses]
+        try:
+            for result in asyncio.as_completed(tasks):
+                if await result:
                     await self.mesh.broadcast_time()
                     return
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def disconnect(self):
         await self.mesh.disconnect()
@@ -171,5 +335,5 @@ class PlejdManager:
             if hw.blacklisted and hw.is_gateway:
                 reconnect = True
         if reconnect:
-            await self.mesh.disconnect()
+            await self.mesh.disconnect(close=False)
         await self.ping()
@@ -3,6 +3,7 @@ import binascii
 import logging
 import os
 from datetime import datetime, timedelta
+from enum import StrEnum
 from typing import Callable
 import time
 
@@ -10,13 +11,18 @@ from bleak import BleakClient, BleakError
 from bleak.backends.device import BLEDevice
 from bleak_retry_connector import establish_connection
 
-from .crypto import auth_response, encrypt_decrypt
+from .crypto import auth_response, CipherContext
 from . import ble_characteristics as gatt
 from . import payload_encode
 from .lastdata import LastData, MiniPkg
-from .lightlevel import parse_lightlevels, LightLevel
+from .lightlevel import parse_lightlevels, LightLevel, LightLevels
 from .ble_characteristics import PLEJD_SERVICE
 from .debug import rec_log
+from .write_queue import WriteQueue, InflightWindow
+from .scheduler import Priority, PriorityLock
+from .link_quality import LinkQuality
+from .mesh_cache import read_cache, write_cache
+from .correlation import PendingReplies
 
 _LOGGER = logging.getLogger(__name__)
 _CONNECTION_LOG = logging.getLogger("pyplejd.ble.connection")
@@ -30,14 +36,17 @@ class MeshDevice:
     bleDevice: BLEDevice = None
     is_gateway: bool = False
 
+    def __init__(self):
+        self.link = LinkQuality()
+
     def see(self, rssi, bleDevice: BLEDevice) -> bool:
         # Returns true if first seen
         if (first_seen := self.rssi) is None:
             self.bleDevice = bleDevice
-            self.rssi = rssi
 
         self.last_seen = datetime.now()
-        self.rssi = max(self.rssi, rssi)
+        self.link.seen(rssi)
+        self.rssi = round(self.link.rssi)
 
         return first_seen
 
@@ -49,65 +58,414 @@ def normalize_address(addr: str) -> str:
     return addr.replace(":", "").upper()
 
 
+# Ingest queue overflow policies
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+ADDRESS_CACHE_SIZE = 1024
+
+# Number of previous gateways to remember in the mesh cache
+PREFERRED_GATEWAYS = 3
+
+# Policies for writes issued while a connection is being set up
+WRITE_FAIL_FAST = "fail_fast"
+WRITE_WAIT = "wait"
+WRITE_HOLD = "hold"
+
+# Seconds between attempts to write a held frame which failed
+HOLD_RETRY_DELAY = 0.5
+
+
+class ConnectionState(StrEnum):
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    AUTHENTICATING = "authenticating"
+    READY = "ready"
+
+
 class PlejdMesh:
     def __init__(self, manager):
         self.manager = manager
         self._mesh_devices: dict[str, MeshDevice] = {}
+        # BLE addresses as reported by advertisements, including ones which
+        # don't belong to the mesh
+        self._address_cache: dict[str, MeshDevice | None] = {}
         self._gateway_node = None
         self._crypto_key: bytearray = None
+        self._cipher: CipherContext = None
         self._client: BleakClient = None
 
-        self._ble_lock = asyncio.Lock()
+        # All GATT traffic is serialized by priority. Setting up a connection
+        # is serialized separately, so it never holds up traffic to a
+        # connection which is already up.
+        self._ble_lock = PriorityLock()
+        self._connect_lock = asyncio.Lock()
+        self._state = ConnectionState.DISCONNECTED
+        self._ready = asyncio.Event()
+
+        # Writes issued while connecting wait for at most write_wait_timeout
+        # seconds with WRITE_WAIT, or fail right away with WRITE_FAIL_FAST.
+        # With WRITE_HOLD, frames are also kept while disconnected, and put
+        # back if writing them fails. They are written as soon as the
+        # connection is ready, unless they are older than write_wait_timeout
+        # by then.
+        self.write_policy = WRITE_WAIT
+        self.write_wait_timeout = 30.0
+
+        # With connect_race > 1, that many nodes are tried at the same time.
+        # Each attempt starts connect_stagger seconds after the previous one,
+        # or as soon as it fails, and the first node to authenticate wins.
+        # Racing gives up after connect_budget seconds.
+        self.connect_race = 1
+        self.connect_stagger = 0.25
+        self.connect_budget = 30.0
+
+        # With warm_standby set, a second node is kept connected and
+        # authenticated, but without notifications. It takes over right away
+        # if the gateway is lost. Frames already received from the old
+        # gateway are dropped for failover_dedup_window seconds after that.
+        self.warm_standby = False
+        self.failover_dedup_window = 2.0
+        self._standby: tuple[MeshDevice, BleakClient] = None
+        self._standby_task: asyncio.Task = None
+        self._failover_task: asyncio.Task = None
+        self._recent: dict[bytes, float] = {}
+        self._dedup_until = 0.0
+
+        self._connection_stats = {
+            "connects": 0,
+            "failed_connects": 0,
+            "attempts": 0,
+            "failovers": 0,
+            "failover_time": None,
+            "duplicates": 0,
+            "connect_time": None,
+            "blocked": 0,
+            "blocked_time": 0.0,
+            "max_blocked_time": 0.0,
+            "rejected": 0,
+            "held": 0,
+            "time_to_first_command": None,
+        }
+        self._started = time.monotonic()
+
+        # Optionally, the gateways which worked and the link statistics are
+        # kept in a file between restarts. A node which was the gateway last
+        # time is connected to as soon as it's seen.
+        self._cache_path: str = None
+        self._preferred: list[str] = []
+        self._preferred_task: asyncio.Task = None
+        self._cache_save: asyncio.Future = None
+        self._cache_dirty = False
+
+        # Keepalive. Notifications received within the current interval are
+        # proof that the link is alive, otherwise the gateway is pinged.
+        # The interval doubles up to keepalive_max while the link is fine and
+        # drops to keepalive_min after a failure. The state of the mesh is
+        # only refreshed every full_poll_interval seconds, or when recovering.
+        self.keepalive_min = 30.0
+        self.keepalive_max = 600.0
+        self.keepalive_max_failures = 2
+        self.full_poll_interval = 600.0
+        self._keepalive_interval = self.keepalive_min
+        self._keepalive_failures = 0
+        self._last_rx = 0.0
+        self._last_refresh = 0.0
+        self._keepalive_stats = {
+            "probes": 0,
+            "avoided": 0,
+            "failures": 0,
+            "polls": 0,
+            "reads": 0,
+            "skipped_polls": 0,
+        }
+
+        # Notifications are queued by the bleak callbacks and handled by a
+        # separate task, so slow listeners never block the notification stream
+        self.ingest_queue_size = 256
+        self.ingest_overflow = DROP_OLDEST
+        self._ingest: asyncio.Queue = None
+        self._ingest_task: asyncio.Task = None
+        self._poll_buttons_task: asyncio.Task = None
+        self._ingest_stats = {
+            "received": 0,
+            "dropped": 0,
+            "max_depth": 0,
+            "queued_time": 0.0,
+            "max_queued_time": 0.0,
+        }
+
+        # Outgoing frames pass through a queue where superseded commands are
+        # replaced before they are written
+        self.write_coalesce_window = 0.0
+        self.write_queue_size = 256
+        self._writes = WriteQueue()
+        self._write_task: asyncio.Task = None
+
+        # Requests waiting for their reply from the mesh
+        self.request_timeout = 5.0
+        self._replies = PendingReplies()
+
+        # With pipeline_window > 0, frames are written without response and
+        # up to that many may be waiting for their echo from the mesh.
+        # After a failed write, acknowledged writes are used for
+        # pipeline_fallback seconds.
+        self.pipeline_window = 0
+        self.pipeline_confirm_timeout = 1.0
+        self.pipeline_fallback = 60.0
+        self._inflight = InflightWindow()
+        self._pipeline_suspended_until = 0.0
 
     @property
     def connected(self):
-        return self._client is not None
+        return self._state == ConnectionState.READY
+
+    @property
+    def state(self) -> ConnectionState:
+        return self._state
+
+    @property
+    def connection_stats(self) -> dict:
+        standby = self._standby[0].BLEaddress if self._standby else None
+        return {
+            **self._connection_stats,
+            "state": str(self._state),
+            "standby": standby,
+        }
+
+    def _set_state(self, state: ConnectionState):
+        if state == self._state:
+            return
+        _CONNECTION_LOG.debug("Connection state %s -> %s", self._state, state)
+        self._state = state
+        if state == ConnectionState.READY:
+            self._ready.set()
+        else:
+            self._ready.clear()
+
+    @property
+    def ingest_stats(self) -> dict:
+        depth = self._ingest.qsize() if self._ingest is not None else 0
+        return {**self._ingest_stats, "depth": depth}
+
+    @property
+    def keepalive_interval(self) -> float:
+        return self._keepalive_interval
+
+    @property
+    def keepalive_stats(self) -> dict:
+        return {
+            **self._keepalive_stats,
+            "interval": self._keepalive_interval,
+            "last_rx_age": time.monotonic() - self._last_rx,
+        }
+
+    @property
+    def request_stats(self) -> dict:
+        return {**self._replies.stats, "pending": len(self._replies)}
+
+    @property
+    def scheduler_stats(self) -> dict:
+        return self._ble_lock.stats
+
+    @property
+    def write_stats(self) -> dict:
+        return {
+            **self._writes.stats,
+            **self._inflight.stats,
+            "pending": len(self._writes),
+            "inflight": len(self._inflight),
+            "window": self._inflight.window if self._pipelined() else 0,
+        }
 
     def expect_device(self, node: MeshDevice = None):
         self._mesh_devices[node.BLEaddress] = node
+        self._address_cache.clear()
 
     def see_device(self, node: BLEDevice, rssi: int) -> bool:
-        _CONNECTION_LOG.debug(f"Saw device {node} (rssi: {rssi})")
-        addr = normalize_address(node.address)
-        if hw := self._mesh_devices.get(addr):
-            return hw.see(rssi, node)
-        return False
+        # Called for every advertisement
+        _CONNECTION_LOG.debug("Saw device %s (rssi: %s)", node, rssi)
+        cache = self._address_cache
+        try:
+            hw = cache[node.address]
+        except KeyError:
+            if len(cache) >= ADDRESS_CACHE_SIZE:
+                cache.clear()
+            hw = cache[node.address] = self._mesh_devices.get(
+                normalize_address(node.address)
+            )
+        if hw is None:
+            return False
+        if hw.rssi is None and hw.BLEaddress in self._preferred:
+            retval = hw.see(rssi, node)
+            self._connect_preferred(hw)
+            return retval
+        return hw.see(rssi, node)
+
+    def _connect_preferred(self, node: MeshDevice):
+        if self._state != ConnectionState.DISCONNECTED or not node.connectable:
+            return
+        if self._preferred_task is None or self._preferred_task.done():
+            _CONNECTION_LOG.debug("Saw previous gateway %s, connecting", node)
+            self._preferred_task = asyncio.create_task(self.connect())
+
+    async def load_cache(self, path: str):
+        self._cache_path = path
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, read_cache, path)
+        for address, link in data.get("nodes", {}).items():
+            if node := self._mesh_devices.get(address):
+                node.link.restore(link)
+        self._preferred = [
+            a for a in data.get("gateways", []) if a in self._mesh_devices
+        ]
+
+    def _save_cache(self):
+        if self._cache_path is None:
+            return
+        if self._gateway_node is not None:
+            gateway = self._gateway_node.BLEaddress
+            self._preferred = [gateway] + [a for a in self._preferred if a != gateway][
+                : PREFERRED_GATEWAYS - 1
+            ]
+        if self._cache_save is not None:
+            # One save at a time, the latest state is saved when it's done
+            self._cache_dirty = True
+            return
+        stats = self._connection_stats
+        data = {
+            "gateways": self._preferred,
+            "nodes": {
+                address: node.link.state()
+                for address, node in self._mesh_devices.items()
+                if node.link.attempts
+            },
+            "timings": {
+                "connect_time": stats["connect_time"],
+                "time_to_first_command": stats["time_to_first_command"],
+            },
+        }
+        loop = asyncio.get_running_loop()
+        self._cache_save = loop.run_in_executor(
+            None, write_cache, self._cache_path, data
+        )
+        self._cache_save.add_done_callback(self._cache_saved)
+
+    def _cache_saved(self, _):
+        self._cache_save = None
+        if self._cache_dirty:
+            self._cache_dirty = False
+            self._save_cache()
 
     def set_key(self, key: str):
         self._crypto_key = key
+        self._cipher = None
 
-    async def disconnect(self):
-        if not self._client:
+    async def disconnect(self, close: bool = True):
+        # With close, background work stops and queued writes fail. Otherwise
+        # only the gateway is dropped, e.g. to reconnect through another node.
+        self._stop_ingest()
+        await self._stop_standby()
+        if close:
+            self._stop_tasks()
+        if not (client := self._client):
             return False
+        self._connection_lost()
         try:
-            await self._client.stop_notify(gatt.PLEJD_LASTDATA)
-            await self._client.stop_notify(gatt.PLEJD_LIGHTLEVEL)
-            await self._client.disconnect()
+            await client.stop_notify(gatt.PLEJD_LASTDATA)
+            await client.stop_notify(gatt.PLEJD_LIGHTLEVEL)
+            await client.disconnect()
         except BleakError:
             pass
+
+    def _stop_tasks(self):
+        current = asyncio.current_task()
+        for name in (
+            "_write_task",
+            "_failover_task",
+            "_preferred_task",
+            "_poll_buttons_task",
+        ):
+            task = getattr(self, name)
+            if task is not None and task is not current:
+                task.cancel()
+            setattr(self, name, None)
+        self._writes.clear()
+
+    def _connection_lost(self):
         self._client = None
+        self._set_state(ConnectionState.DISCONNECTED)
+        self._inflight.clear()
+        self._release_gateway()
+        if self._standby_task is not None:
+            self._standby_task.cancel()
         self.manager.connect_callback(False)
 
+    def _release_gateway(self):
+        if self._gateway_node:
+            self._gateway_node.is_gateway = False
+            self._gateway_node.update()
+            self._gateway_node = None
+
+    def _disconnected(self, client: BleakClient):
+        if self._standby is not None and client is self._standby[1]:
+            _CONNECTION_LOG.debug("Lost standby connection (%s)", client)
+            self._standby = None
+            self._start_standby()
+            return
+        if client is not self._client:
+            # A candidate which was dropped while connecting
+            return
+        _CONNECTION_LOG.debug("Disconected from BLE mesh (%s)", client)
+        if (standby := self._standby) is None:
+            self._connection_lost()
+            return
+
+        # Keep devices available, the standby takes over in a moment
+        self._standby = None
+        self._client = None
+        self._set_state(ConnectionState.CONNECTING)
+        self._inflight.clear()
+        self._release_gateway()
+        self._failover_task = asyncio.create_task(self._failover(*standby))
+
     async def connect(self):
         if self.connected:
             return True
-        _CONNECTION_LOG.debug("Trying to connect to BLE mesh")
-
-        def _disconnect(reason):
-            _CONNECTION_LOG.debug("Disconected from BLE mesh (%s)", reason)
-            self._client = None
-            if self._gateway_node:
-                self._gateway_node.is_gateway = False
-                self._gateway_node.update()
-                self._gateway_node = None
-            self.manager.connect_callback(False)
+        async with self._connect_lock:
+            # Someone else may have connected while we waited
+            if self.connected:
+                return True
+            start = time.monotonic()
+            self._set_state(ConnectionState.CONNECTING)
+            try:
+                connected = await self._connect()
+            finally:
+                if not self.connected:
+                    self._set_state(ConnectionState.DISCONNECTED)
+            stats = self._connection_stats
+            if connected:
+                stats["connects"] += 1
+                stats["connect_time"] = time.monotonic() - start
+                self._save_cache()
+                await self.poll()
+                self._start_standby()
+            else:
+                stats["failed_connects"] += 1
+            return connected
 
-        # Try to connect to nodes in order of decreasing RSSI
+    def _candidates(self) -> list[MeshDevice]:
+        # Nodes to connect to, the one expected to be ready soonest first
         filtered_nodes = filter(
             lambda n: n.connectable and n.rssi is not None,
             self._mesh_devices.values(),
         )
-        sorted_nodes = sorted(filtered_nodes, key=lambda n: n.rssi, reverse=True)
+        return sorted(filtered_nodes, key=lambda n: n.link.expected_time)
+
+    async def _connect(self):
+        _CONNECTION_LOG.debug("Trying to connect to BLE mesh")
+
+        sorted_nodes = self._candidates()
 
         # _CONNECTION_LOG.debug(f"Expected nodes: {self._expected_nodes}")
         # _CONNECTION_LOG.debug(f"Connectable expected nodes: {self._connectable_nodes}")
@@ -123,93 +481,384 @@ class PlejdMesh:
             #     self._connectable_nodes,
             # )
             return False
-        client = None
-        for node in sorted_nodes:
-            try:
-                _CONNECTION_LOG.debug("Attempting to connect to %s", node)
-                client = await establish_connection(
-                    BleakClient,
-                    node.bleDevice,
-                    "plejd",
-                    _disconnect,
-                    max_attempts=1,
-                )
-
-                if not await self._authenticate(client):
-                    await client.disconnect()
-                    continue
-                self._gateway_node = node
-                node.is_gateway = True
-                self._gateway_node.update()
-                break
-
-            except (BleakError, asyncio.TimeoutError) as e:
-                _CONNECTION_LOG.warning("Failed to connect to %s: %s", node, str(e))
-
+        winner = None
+        if self.connect_race > 1:
+            winner = await self._race(sorted_nodes)
         else:
+            for node in sorted_nodes:
+                self._set_state(ConnectionState.CONNECTING)
+                if client := await self._attempt(node):
+                    winner = (node, client)
+                    break
+
+        if winner is None:
             _CONNECTION_LOG.warning(
                 "Failed to connect to plejd mesh - %s", sorted_nodes
             )
             return False
 
-        async def _lastdata_listener(_arg, lastdata: bytearray):
-
-            data = encrypt_decrypt(
-                self._crypto_key, self._gateway_node.BLEaddress, lastdata
-            )
+        await self._activate(*winner)
+        return True
 
-            ld = LastData(data)
-            rec_log(f"lastdata {ld}")
-            await self.manager.lastdata_callback(ld)
+    async def _activate(self, node: MeshDevice, client: BleakClient):
+        # Make an authenticated client the gateway
+        self._gateway_node = node
+        self._cipher = CipherContext(self._crypto_key, node.BLEaddress)
+        node.is_gateway = True
+        self._gateway_node.update()
 
-            if ld.command == LastData.CMD_EVENT_FIRED:
-                await self.poll_buttons()
+        def _lastdata_listener(_, lastdata: bytearray):
+            self._enqueue(gatt.PLEJD_LASTDATA, lastdata)
 
-        async def _lightlevel_listener(_, lightlevel: bytearray):
-            rec_log(f"lightlevel {lightlevel}")
-            await self.manager.lightlevel_callback(parse_lightlevels(lightlevel))
+        def _lightlevel_listener(_, lightlevel: bytearray):
+            self._enqueue(gatt.PLEJD_LIGHTLEVEL, lightlevel)
 
+        self._start_ingest()
         await client.start_notify(gatt.PLEJD_LASTDATA, _lastdata_listener)
         await client.start_notify(gatt.PLEJD_LIGHTLEVEL, _lightlevel_listener)
         self._client = client
+        self._set_state(ConnectionState.READY)
 
         self.manager.connect_callback(True)
 
+    async def _failover(self, node: MeshDevice, client: BleakClient):
+        start = time.monotonic()
+        async with self._connect_lock:
+            if self.connected:
+                # Someone else reconnected first
+                await self._drop_client(client)
+                return
+            try:
+                await self._activate(node, client)
+            except (BleakError, asyncio.TimeoutError) as e:
+                _CONNECTION_LOG.warning("Failover to %s failed: %s", node, str(e))
+                await self._drop_client(client)
+                self._connection_lost()
+                return
+        stats = self._connection_stats
+        stats["failovers"] += 1
+        stats["failover_time"] = time.monotonic() - start
+        self._save_cache()
+        _CONNECTION_LOG.debug("Failed over to %s", node)
+        self._dedup_until = time.monotonic() + self.failover_dedup_window
+
         await self.poll()
-        return True
+        self._start_standby()
+
+    def _start_standby(self):
+        if not self.warm_standby or self._standby is not None or not self.connected:
+            return
+        if self._standby_task is None or self._standby_task.done():
+            self._standby_task = asyncio.create_task(self._connect_standby())
+
+    async def _connect_standby(self):
+        for node in self._candidates():
+            if node is self._gateway_node:
+                continue
+            if not (client := await self._attempt(node)):
+                continue
+            if not self.connected or self._standby is not None:
+                await self._drop_client(client)
+                return
+            _CONNECTION_LOG.debug("Standby connection to %s", node)
+            self._standby = (node, client)
+            return
+
+    async def _stop_standby(self):
+        if self._standby_task is not None:
+            self._standby_task.cancel()
+            self._standby_task = None
+        if (standby := self._standby) is not None:
+            self._standby = None
+            await self._drop_client(standby[1])
+
+    async def _drop_client(self, client: BleakClient):
+        try:
+            await client.disconnect()
+        except BleakError:
+            pass
+
+    async def _attempt(self, node: MeshDevice):
+        # Returns an authenticated client, or None
+        self._connection_stats["attempts"] += 1
+        start = time.monotonic()
+        client = None
+        authenticated = False
+        try:
+            _CONNECTION_LOG.debug("Attempting to connect to %s", node)
+            client = await establish_connection(
+                BleakClient,
+                node.bleDevice,
+                "plejd",
+                self._disconnected,
+                max_attempts=1,
+            )
+            if not self.connected:
+                self._set_state(ConnectionState.AUTHENTICATING)
+            authenticated = await self._authenticate(client)
+        except (BleakError, asyncio.TimeoutError) as e:
+            _CONNECTION_LOG.warning("Failed to connect to %s: %s", node, str(e))
+        finally:
+            # Also when the attempt was cancelled
+            if client is not None and not authenticated:
+                await self._drop_client(client)
+
+        # Cancelled attempts don't count against the node
+        elapsed = time.monotonic() - start
+        if authenticated:
+            node.link.connected(elapsed)
+            return client
+        node.link.failed(elapsed)
+        return None
+
+    async def _race(self, nodes: list[MeshDevice]):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.connect_budget
+        slots = asyncio.Semaphore(self.connect_race)
+        # go[i] is set when attempt i may start
+        go = [asyncio.Event() for _ in range(len(nodes) + 1)]
+        go[0].set()
+        timers: list[asyncio.TimerHandle] = []
+
+        async def attempt(i: int, node: MeshDevice):
+            await go[i].wait()
+            async with slots:
+                timers.append(loop.call_later(self.connect_stagger, go[i + 1].set))
+                client = await self._attempt(node)
+            if client is None:
+                go[i + 1].set()
+            return node, client
+
+        pending = {
+            asyncio.create_task(attempt(i, node)) for i, node in enumerate(nodes)
+        }
+        winner = None
+        losers = []
+        try:
+            while pending and winner is None:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    _CONNECTION_LOG.debug("No node connected within the time budget")
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    node, client = task.result()
+                    if client is None:
+                        continue
+                    if winner is None:
+                        winner = (node, client)
+                    else:
+                        losers.append(client)
+        finally:
+            for timer in timers:
+                timer.cancel()
+            for task in pending:
+                task.cancel()
+            # Attempts may have finished before they could be cancelled
+            for result in await asyncio.gather(*pending, return_exceptions=True):
+                if isinstance(result, tuple) and result[1] is not None:
+                    losers.append(result[1])
+            for client in losers:
+                await self._drop_client(client)
+        return winner
+
+    def _start_ingest(self):
+        if self._ingest is None:
+            self._ingest = asyncio.Queue(self.ingest_queue_size)
+        if self._ingest_task is None or self._ingest_task.done():
+            self._ingest_task = asyncio.create_task(self._ingest_worker())
+
+    def _stop_ingest(self):
+        if self._ingest_task is not None:
+            self._ingest_task.cancel()
+            self._ingest_task = None
+        self._ingest = None
+
+    def _enqueue(self, characteristic: str, data: bytearray):
+        queue = self._ingest
+        if queue is None:
+            return
+        cipher = self._cipher
+        if characteristic == gatt.PLEJD_LASTDATA and len(self._inflight) and data:
+            # Echoes free their pipeline slot right away, even if the frames
+            # ahead of them take a while to handle
+            self._inflight.confirm(cipher.address(data))
+        stats = self._ingest_stats
+        stats["received"] += 1
+        if queue.full():
+            stats["dropped"] += 1
+            if self.ingest_overflow == DROP_NEWEST:
+                return
+            queue.get_nowait()
+        # The cipher is captured here, since the gateway may change before
+        # the frame is handled
+        self._last_rx = now = time.monotonic()
+        queue.put_nowait((characteristic, cipher, data, now))
+        stats["max_depth"] = max(stats["max_depth"], queue.qsize())
+
+    async def _ingest_worker(self):
+        queue = self._ingest
+        stats = self._ingest_stats
+        while True:
+            characteristic, cipher, data, queued = await queue.get()
+            waited = time.monotonic() - queued
+            stats["queued_time"] += waited
+            stats["max_queued_time"] = max(stats["max_queued_time"], waited)
+            try:
+                if characteristic == gatt.PLEJD_LASTDATA:
+                    await self._handle_lastdata(cipher, data)
+                else:
+                    await self._handle_lightlevel(data)
+            except Exception:
+                _LOGGER.exception("Error handling notification from plejd mesh")
+
+    async def _handle_lastdata(self, cipher: CipherContext, lastdata: bytearray):
+        plain = cipher.encrypt_decrypt(lastdata)
+        if self.warm_standby and self._duplicate(plain):
+            self._connection_stats["duplicates"] += 1
+            return
+        ld = LastData(plain)
+        rec_log(lambda: f"lastdata {ld}")
+        if ld.command_type == LastData.CMDT_READ:
+            # State requests, like our own reads relayed by the mesh, carry
+            # no state
+            return
+        self._replies.resolve(ld)
+        await self.manager.lastdata_callback(ld)
+
+        if ld.command == LastData.CMD_EVENT_FIRED:
+            # Don't hold up the notification stream waiting for the write
+            if self._poll_buttons_task is None or self._poll_buttons_task.done():
+                self._poll_buttons_task = asyncio.create_task(self.poll_buttons())
+
+    def _duplicate(self, frame: bytes) -> bool:
+        # True for frames seen shortly before, right after a failover
+        now = time.monotonic()
+        window = self.failover_dedup_window
+        recent = self._recent
+        duplicate = (
+            now < self._dedup_until and now - recent.get(frame, -window) < window
+        )
+        recent[frame] = now
+        if len(recent) > 256:
+            self._recent = {f: t for f, t in recent.items() if now - t < window}
+        return duplicate
+
+    async def _handle_lightlevel(self, lightlevel: bytearray):
+        rec_log(lambda: f"lightlevel {lightlevel}")
+        await self.manager.lightlevel_callback(parse_lightlevels(lightlevel))
 
     async def poll(self):
         client = self._client
         if client is None:
             return
         _LOGGER.debug("Polling mesh for current state")
-        await client.write_gatt_char(gatt.PLEJD_LIGHTLEVEL, b"\x01", response=True)
+        self._keepalive_stats["polls"] += 1
+        async with self._ble_lock(Priority.REFRESH):
+            await client.write_gatt_char(gatt.PLEJD_LIGHTLEVEL, b"\x01", response=True)
+
+    async def read_state(self, *addresses: int) -> bool:
+        # Ask single outputs for their state, instead of polling the whole mesh
+        frames = []
+        for address in addresses:
+            cmd = LastData(address=address, command=LastData.CMD_OUTPUT_STATE_AND_LEVEL)
+            cmd.command_type = LastData.CMDT_READ
+            frames.append(cmd.to_bytes())
+        if not frames:
+            return True
+        _LOGGER.debug("Reading state of %s", addresses)
+        self._keepalive_stats["reads"] += len(frames)
+        return await self.write(*frames, priority=Priority.REFRESH)
 
     async def poll_buttons(self):
-        await self.write(LastData(command=LastData.CMD_EVENT_PREPARE).hex)
+        await self.write(
+            LastData(command=LastData.CMD_EVENT_PREPARE).to_bytes(),
+            priority=Priority.HOUSEKEEPING,
+        )
 
     async def ping(self):
-        retval = False
-        async with self._ble_lock:
-            if not await self.connect():
-                retval = False
-            if await self._ping(self._client):
+        reconnected = not self.connected
+        if not await self.connect():
+            return False
+        stats = self._keepalive_stats
+        now = time.monotonic()
+        if not reconnected and now - self._last_rx < self._keepalive_interval:
+            stats["avoided"] += 1
+            alive = True
+        else:
+            stats["probes"] += 1
+            async with self._ble_lock(Priority.HOUSEKEEPING):
+                alive = await self._ping(self._client)
+
+        if not alive:
+            stats["failures"] += 1
+            self._keepalive_failures += 1
+            self._keepalive_interval = self.keepalive_min
+            if self._keepalive_failures >= self.keepalive_max_failures:
+                _CONNECTION_LOG.warning("Plejd mesh stopped responding, disconnecting")
+                await self.disconnect(close=False)
+            return False
+
+        recovering = reconnected or self._keepalive_failures > 0
+        self._keepalive_failures = 0
+        if recovering:
+            self._keepalive_interval = self.keepalive_min
+        else:
+            self._keepalive_interval = min(
+                self.keepalive_max, self._keepalive_interval * 2
+            )
+        if recovering or now - self._last_refresh >= self.full_poll_interval:
+            self._last_refresh = now
+            if reconnected:
+                # connect() has already polled the whole mesh
+                pass
+            elif recovering:
                 await self.poll()
-                retval = True
-        if retval:
+            else:
+                # The manager knows which outputs need it
+                await self.manager.refresh()
             await self.poll_buttons()
-        return retval
+        else:
+            stats["skipped_polls"] += 1
+        self._start_standby()
+        return True
+
+    async def request(
+        self,
+        payload: bytes | str,
+        address: int,
+        command: int,
+        timeout: float = None,
+        priority: Priority = Priority.REFRESH,
+    ) -> LastData | None:
+        # Write a request and wait for the reply from address with the same
+        # command. Returns None if there was no reply within the timeout.
+        if timeout is None:
+            timeout = self.request_timeout
+        future = self._replies.expect(address, command)
+        timed_out = False
+        try:
+            if not await self.write(payload, priority=priority):
+                return None
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            return None
+        finally:
+            self._replies.discard(address, command, future, timed_out)
 
     async def poll_time(self, address: int):
-        client = self._client
-        if client is None:
+        if not self.connected:
             return False
-        payloads = payload_encode.request_time(self, address)
-        await self.write(payloads)
-
-        retval = await client.read_gatt_char(gatt.PLEJD_LASTDATA)
-        data = encrypt_decrypt(self._crypto_key, self._gateway_node.BLEaddress, retval)
-        ts = int.from_bytes(data[5:9], "little")
+        payload = payload_encode.request_time(self, address)
+        reply = await self.request(
+            payload, address, LastData.CMD_TIME, priority=Priority.HOUSEKEEPING
+        )
+        if reply is None or len(reply.payload) < 4:
+            return False
+        ts = int.from_bytes(reply.payload[0:4], "little")
         dt = datetime.fromtimestamp(ts)
 
         now = datetime.now() + timedelta(seconds=3600 * time.daylight)
@@ -220,36 +869,152 @@ class PlejdMesh:
 
     async def broadcast_time(self):
         payloads = payload_encode.set_time(self)
-        await self.write(payloads)
-
-    async def write(self, *payloads: list[str]):
-        pl = [
-            encrypt_decrypt(
-                self._crypto_key,
-                self._gateway_node.BLEaddress,
-                binascii.a2b_hex(payload.replace(" ", "")),
+        await self.write(payloads, priority=Priority.HOUSEKEEPING)
+
+    async def write(
+        self,
+        *payloads: bytes | bytearray | memoryview | str,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: float = None,
+    ):
+        # Returns True once all frames are written, or False if that failed
+        # or took longer than timeout
+        if not self.connected and not await self._wait_ready():
+            return False
+        frames = [
+            (
+                binascii.a2b_hex(payload.replace(" ", ""))
+                if isinstance(payload, str)
+                else payload
             )
             for payload in payloads
         ]
-        _LOGGER.debug(f"Write: {payloads}")
-        await self._write(pl)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Write: %s", [bytes(f).hex() for f in frames])
+
+        futures = [self._writes.put(f, priority) for f in frames]
+        if len(self._writes) > self.write_queue_size:
+            self._writes.trim(self.write_queue_size)
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_worker())
+        try:
+            # Held frames may still be written after the caller gave up
+            result = all(
+                await asyncio.wait_for(
+                    asyncio.shield(asyncio.gather(*futures)), timeout
+                )
+            )
+        except asyncio.TimeoutError:
+            return False
+        stats = self._connection_stats
+        if result and stats["time_to_first_command"] is None:
+            stats["time_to_first_command"] = time.monotonic() - self._started
+            self._save_cache()
+        return result
 
-    async def _write(self, payloads):
+    async def _wait_ready(self) -> bool:
+        # Called by writes issued while not connected
+        stats = self._connection_stats
+        if self.write_policy == WRITE_HOLD:
+            stats["held"] += 1
+            return True
+        if (
+            self._state == ConnectionState.DISCONNECTED
+            or self.write_policy == WRITE_FAIL_FAST
+        ):
+            stats["rejected"] += 1
+            return False
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.write_wait_timeout)
+        except asyncio.TimeoutError:
+            stats["rejected"] += 1
+            return False
+        finally:
+            blocked = time.monotonic() - start
+            stats["blocked"] += 1
+            stats["blocked_time"] += blocked
+            stats["max_blocked_time"] = max(stats["max_blocked_time"], blocked)
+        return True
+
+    async def _write_worker(self):
+        writes = self._writes
+        while True:
+            if self.write_policy == WRITE_HOLD:
+                max_age = self.write_wait_timeout
+                writes.expire(max_age)
+                if not self.connected and len(writes):
+                    # Flush held frames, in order of priority, once ready.
+                    # Until then, only wake up when the first one expires.
+                    timeout = writes.next_expiry(max_age) - time.monotonic()
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+            entry = await writes.get(self.write_coalesce_window)
+            # The policy and the connection may have changed while waiting
+            if self.write_policy == WRITE_HOLD and not self.connected:
+                writes.requeue(entry, failed=False)
+                continue
+            result = False
+            try:
+                result = await self._write([entry.frame], entry.priority, entry.queued)
+            except asyncio.CancelledError:
+                entry.resolve(False)
+                raise
+            if result or self.write_policy != WRITE_HOLD:
+                entry.resolve(result)
+                continue
+            writes.requeue(entry)
+            if self.connected:
+                await asyncio.sleep(HOLD_RETRY_DELAY)
+
+    async def _write(
+        self,
+        frames,
+        priority: Priority = Priority.INTERACTIVE,
+        since: float = None,
+    ):
         client = self._client
-        if client is None:
+        cipher = self._cipher
+        if client is None or cipher is None:
             return False
+        pipelined = self._pipelined()
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
         try:
-            async with self._ble_lock:
-                for payload in payloads:
-                    _LOGGER.debug("Writing to plejd mesh: %s", payload.hex())
-                    await self._client.write_gatt_char(
-                        gatt.PLEJD_DATA, payload, response=True
+            for frame in frames:
+                payload = cipher.encrypt_decrypt(frame)
+                if pipelined:
+                    await self._inflight.acquire()
+                async with self._ble_lock(priority, since):
+                    if debug:
+                        _LOGGER.debug("Writing to plejd mesh: %s", payload.hex())
+                    await client.write_gatt_char(
+                        gatt.PLEJD_DATA, payload, response=not pipelined
                     )
+                if pipelined:
+                    self._inflight.sent(frame[0], self.pipeline_confirm_timeout)
         except (BleakError, asyncio.TimeoutError) as e:
             _LOGGER.warning("Writing to plejd mesh failed: %s", str(e))
+            if pipelined:
+                self._pipeline_suspended_until = (
+                    time.monotonic() + self.pipeline_fallback
+                )
+                self._inflight.clear()
             return False
         return True
 
+    def _pipelined(self) -> bool:
+        if self.pipeline_window <= 0:
+            return False
+        self._inflight.size = self.pipeline_window
+        if self._inflight.stalled:
+            _LOGGER.debug("Writes are not echoed by the mesh, stop pipelining")
+            self._inflight.stalled = False
+            self._pipeline_suspended_until = time.monotonic() + self.pipeline_fallback
+        return time.monotonic() >= self._pipeline_suspended_until
+
     async def _ping(self, client):
         if client is None:
             return False
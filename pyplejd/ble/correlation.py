@@ -0,0 +1,78 @@
+import asyncio
+import time
+from collections import deque
+
+from .lastdata import LastData
+
+
+class PendingReplies:
+    # Requests waiting for a reply from the mesh, by address and command.
+    # Replies are picked out of the normal notification stream, so any number
+    # of requests may be outstanding. Replies to requests which already timed
+    # out are counted as orphans.
+
+    def __init__(self):
+        self._pending: dict[tuple[int, int], deque] = {}
+        self._expired: dict[tuple[int, int], int] = {}
+        self.stats = {
+            "requests": 0,
+            "replies": 0,
+            "timeouts": 0,
+            "orphans": 0,
+            "reply_time": 0.0,
+            "max_reply_time": 0.0,
+        }
+
+    def __len__(self):
+        return sum(len(w) for w in self._pending.values())
+
+    def expect(self, address: int, command: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._pending.setdefault((address, command), deque())
+        waiters.append((future, time.monotonic()))
+        self.stats["requests"] += 1
+        return future
+
+    def resolve(self, data: LastData) -> bool:
+        if not self._pending and not self._expired:
+            return False
+        key = (data.address, data.command)
+        waiters = self._pending.get(key)
+        while waiters:
+            future, sent = waiters.popleft()
+            if future.done():
+                continue
+            future.set_result(data)
+            waited = time.monotonic() - sent
+            stats = self.stats
+            stats["replies"] += 1
+            stats["reply_time"] += waited
+            stats["max_reply_time"] = max(stats["max_reply_time"], waited)
+            if not waiters:
+                del self._pending[key]
+            return True
+        self._pending.pop(key, None)
+
+        if expired := self._expired.get(key):
+            self.stats["orphans"] += 1
+            if expired > 1:
+                self._expired[key] = expired - 1
+            else:
+                del self._expired[key]
+        return False
+
+    def discard(
+        self, address: int, command: int, future: asyncio.Future, timed_out: bool
+    ):
+        # Called when a request is done waiting, with or without a reply
+        key = (address, command)
+        if waiters := self._pending.get(key):
+            for entry in waiters:
+                if entry[0] is future:
+                    waiters.remove(entry)
+                    break
+            if not waiters:
+                del self._pending[key]
+        if timed_out:
+            self.stats["timeouts"] += 1
+            self._expired[key] = self._expired.get(key, 0) + 1
@@ -1,25 +1,44 @@
 import binascii
 import hashlib
-import struct
 
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 
 
-def encrypt_decrypt(key: str, addr: str, data: bytearray) -> bytearray:
-    key = binascii.a2b_hex(key.replace("-", ""))
-    addr = binascii.a2b_hex(addr.replace("-", "").replace(":", ""))[::-1]
+class CipherContext:
+    # The plejd mesh "encryption" is a XOR with a 16 byte keystream which only
+    # depends on the crypto key and the gateway address, so it can be computed
+    # once per connection and reused for every frame.
+
+    __slots__ = ("_keystream",)
+
+    def __init__(self, key: str, addr: str):
+        key = binascii.a2b_hex(key.replace("-", ""))
+        addr = binascii.a2b_hex(addr.replace("-", "").replace(":", ""))[::-1]
+
+        buf = addr + addr + addr[:4]
+
+        ct = Cipher(algorithms.AES(key), modes.ECB(), backend=default_backend())
+        ct = ct.encryptor()
+        self._keystream = ct.update(buf) + ct.finalize()
+
+    def encrypt_decrypt(self, data: bytes | bytearray | memoryview) -> bytes:
+        length = len(data)
+        keystream = self._keystream
+        while len(keystream) < length:
+            keystream += self._keystream
+        return (
+            int.from_bytes(data, "little")
+            ^ int.from_bytes(keystream[:length], "little")
+        ).to_bytes(length, "little")
 
-    buf = addr + addr + addr[:4]
+    def address(self, frame: bytes | bytearray | memoryview) -> int:
+        # The address of an encrypted LASTDATA frame, without decrypting it
+        return frame[0] ^ self._keystream[0]
 
-    ct = Cipher(algorithms.AES(bytearray(key)), modes.ECB(), backend=default_backend())
-    ct = ct.encryptor()
-    ct = ct.update(buf)
 
-    output = b""
-    for i, d in enumerate(data):
-        output += struct.pack("B", d ^ ct[i % 16])
-    return output
+def encrypt_decrypt(key: str, addr: str, data: bytearray) -> bytes:
+    return CipherContext(key, addr).encrypt_decrypt(data)
 
 
 def auth_response(key: str, challenge: bytearray) -> bytearray:
@@ -1,21 +1,47 @@
 import logging
+from functools import cache
+from typing import Callable
 
+# Protocol tracing.
+# Every message goes to the pyplejd.ble.device.all logger and, if an address is
+# given, to pyplejd.ble.device.<address>.
+# Messages may be passed as a callable returning the string. It's then only
+# called if one of the loggers would actually emit it, so building expensive
+# messages costs nothing while tracing is off.
 
-def send_log(message, address=None):
-    L_ALL = logging.getLogger("pyplejd.ble.device.all")
-    if address is not None:
-        L = logging.getLogger(f"pyplejd.ble.device.{address}")
-        L.debug(f"SEND {address}: {message}")
-        L_ALL.debug(f"SEND {address}: {message}")
-    else:
-        L_ALL.debug(f"SEND: {message}")
-
-
-def rec_log(message, address=None):
-    L_ALL = logging.getLogger("pyplejd.ble.device.all")
-    if address is not None:
-        L = logging.getLogger(f"pyplejd.ble.device.{address}")
-        L.debug(f"RECEIVE {address}: {message}")
-        L_ALL.debug(f"RECEIVE {address}: {message}")
-    else:
-        L_ALL.debug(f"RECEIVE: {message}")
+_L_ALL = logging.getLogger("pyplejd.ble.device.all")
+
+
+@cache
+def _device_logger(address) -> logging.Logger:
+    return logging.getLogger(f"pyplejd.ble.device.{address}")
+
+
+def _trace(direction: str, message: str | Callable[[], str], address):
+    # Logger.isEnabledFor is cached by the logging module
+    log_all = _L_ALL.isEnabledFor(logging.DEBUG)
+    if address is None:
+        if log_all:
+            if callable(message):
+                message = message()
+            _L_ALL.debug("%s: %s", direction, message)
+        return
+
+    L = _device_logger(address)
+    log_device = L.isEnabledFor(logging.DEBUG)
+    if not (log_all or log_device):
+        return
+    if callable(message):
+        message = message()
+    if log_device:
+        L.debug("%s %s: %s", direction, address, message)
+    if log_all:
+        _L_ALL.debug("%s %s: %s", direction, address, message)
+
+
+def send_log(message: str | Callable[[], str], address=None):
+    _trace("SEND", message, address)
+
+
+def rec_log(message: str | Callable[[], str], address=None):
+    _trace("RECEIVE", message, address)
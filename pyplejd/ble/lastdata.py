@@ -1,3 +1,5 @@
+import struct
+
 from .debug import rec_log
 
 # Motion event: 03 03 1f 07 00 9c 0f 08 46 06 01
@@ -41,6 +43,8 @@ class MiniPkg:
     SRC_MOTION = 0x03
     SRC_APP = 0x08
 
+    __slots__ = ("type", "flag", "payload")
+
     def __init__(
         self,
         data: bytearray = None,
@@ -57,15 +61,7 @@ class MiniPkg:
 
     @property
     def data(self):
-        header = 0x80 if self.flag else 0
-        header += ((len(self.payload) - 1) & 0x7) << 4
-        if self.type > 0xF:
-            package = [header + 0xF, self.type - 0xF]
-        else:
-            package = [header + (self.type & 0x7)]
-
-        package.extend(self.payload)
-        return package
+        return list(self.to_bytes())
 
     @data.setter
     def data(self, dta):
@@ -76,14 +72,39 @@ class MiniPkg:
         if self.type == 0x0F:
             self.type += int(dta[1])
             start = 2
-        self.payload = [int(i) for i in dta[start : start + length + 1]]
+        # For frames received from the mesh this is a view into the frame
+        self.payload = dta[start : start + length + 1]
 
     @property
     def length(self):
         return len(self.payload) + (2 if self.type > 0x0F else 1)
 
+    def pack_into(self, buffer: bytearray, offset: int = 0) -> int:
+        # Writes the package to buffer at offset and returns the end offset
+        header = 0x80 if self.flag else 0
+        header += ((len(self.payload) - 1) & 0x7) << 4
+        if self.type > 0xF:
+            buffer[offset] = header + 0xF
+            buffer[offset + 1] = self.type - 0xF
+            offset += 2
+        else:
+            buffer[offset] = header + (self.type & 0x7)
+            offset += 1
+        end = offset + len(self.payload)
+        buffer[offset:end] = self.payload
+        return end
+
+    def to_bytes(self) -> bytearray:
+        buffer = bytearray(self.length)
+        self.pack_into(buffer)
+        return buffer
+
     def __repr__(self):
-        return f"{1 if self.flag else 0} {self.length} 0x{self.type:x}: {self.payload} - {"".join(f"{d:02x}" for d in self.data)}"
+        return f"{1 if self.flag else 0} {self.length} 0x{self.type:x}: {list(self.payload)} - {self.to_bytes().hex()}"
+
+
+# Address, version, command type, command
+HEADER = struct.Struct(">BBBH")
 
 
 class LastData:
@@ -91,6 +112,7 @@ class LastData:
     # Commands
     CMD_EVENT_PREPARE = 0x0015  # ask for buttons
     CMD_EVENT_FIRED = 0x0016  # button pressed
+    CMD_TIME = 0x001B
     CMD_SCENE = 0x0021
     CMD_GROUP_OUTPUT_STATE = 0x0097
     CMD_GROUP_OUTPUT_STATE_AND_LEVEL = 0x0098
@@ -109,6 +131,15 @@ class LastData:
     CMDT_READ = 0x2
     CMDT_DONT_RESPOND = 0x10
 
+    __slots__ = (
+        "address",
+        "version",
+        "command_type",
+        "command",
+        "_payload",
+        "_minipkgs",
+    )
+
     def __init__(
         self,
         data: bytearray = None,
@@ -126,42 +157,79 @@ class LastData:
         if data:
             self.data = data
 
+    @property
+    def payload(self) -> list[int | MiniPkg] | memoryview:
+        return self._payload
+
+    @payload.setter
+    def payload(self, payload: list[int | MiniPkg] | memoryview):
+        self._payload = payload
+        self._minipkgs = None
+
     @property
     def data(self) -> list[int]:
-        payload = [*self.payload]
-        if payload and isinstance(payload[0], MiniPkg):
-            payload = []
-            for p in self.payload:
-                payload.extend(p.data)
-        return [
-            self.address,
-            self.version,
-            self.command_type,
-            *self.command.to_bytes(2),
-            *payload,
-        ]
+        return list(self.to_bytes())
 
     @data.setter
-    def data(self, dta: list[int] | bytearray):
-        self.address = int(dta[0])
-        self.command_type = int(dta[2])
-        self.command = int.from_bytes(dta[3:5], byteorder="big")
-        self.payload = dta[5:]
+    def data(self, dta: list[int] | bytes | bytearray | memoryview):
+        if not isinstance(dta, memoryview):
+            if not isinstance(dta, (bytes, bytearray)):
+                dta = bytes(dta)
+            dta = memoryview(dta)
+        if len(dta) >= HEADER.size:
+            self.address, _, self.command_type, self.command = HEADER.unpack_from(dta)
+        else:
+            self.address = dta[0]
+            self.command_type = dta[2]
+            self.command = int.from_bytes(dta[3:5], byteorder="big")
+        self.payload = dta[HEADER.size :]
+
+    def to_bytes(self) -> bytearray:
+        payload = self.payload
+        minipkgs = bool(payload) and isinstance(payload[0], MiniPkg)
+        if minipkgs:
+            length = sum(p.length for p in payload)
+        else:
+            length = len(payload)
+
+        buffer = bytearray(HEADER.size + length)
+        HEADER.pack_into(
+            buffer, 0, self.address, self.version, self.command_type, self.command
+        )
+        if minipkgs:
+            offset = HEADER.size
+            for p in payload:
+                offset = p.pack_into(buffer, offset)
+        else:
+            buffer[HEADER.size :] = payload
+        return buffer
+
+    def __bytes__(self):
+        return bytes(self.to_bytes())
 
     @property
     def hex(self):
-        return "".join(f"{b:02x}" for b in self.data)
+        return self.to_bytes().hex()
 
     def __str__(self):
-        return f"{self.hex} - {self.address} {self.command_type} {self.command} {self.payload}"
+        return f"{self.hex} - {self.address} {self.command_type} {self.command} {list(self.payload)}"
 
     @property
-    def minipkgs(self):
-        offset = 0
-        while offset < len(self.payload):
-            pkg = MiniPkg(self.payload[offset:])
-            offset += pkg.length
-            yield pkg
+    def minipkgs(self) -> tuple[MiniPkg, ...]:
+        # The mini-package table is only parsed on first access
+        if self._minipkgs is None:
+            payload = self.payload
+            if payload and isinstance(payload[0], MiniPkg):
+                self._minipkgs = tuple(payload)
+            else:
+                pkgs = []
+                offset = 0
+                while offset < len(payload):
+                    pkg = MiniPkg(payload[offset:])
+                    offset += pkg.length
+                    pkgs.append(pkg)
+                self._minipkgs = tuple(pkgs)
+        return self._minipkgs
 
 
 def parse_data(data: bytearray):
@@ -1,12 +1,69 @@
+import struct
+
+# Address, state, (3 unknown bytes), dim (little endian), (3 unknown bytes)
+RECORD = struct.Struct("<B?3xH3x")
+PAYLOAD_OFFSET = 5
+
+
 class LightLevel:
 
-    def __init__(self, data: bytearray):
-        self.address = int(data[0])
-        self.state = bool(data[1])
-        self.dim = int.from_bytes(data[5:7], byteorder="little")
-        self.payload = [int(d) for d in data[5:]]
+    __slots__ = ("address", "state", "dim", "payload")
+
+    def __init__(self, data: bytearray = None, /):
+        if data is not None:
+            self.address = int(data[0])
+            self.state = bool(data[1])
+            self.dim = int.from_bytes(data[5:7], byteorder="little")
+            self.payload = memoryview(data)[PAYLOAD_OFFSET:]
+
+    @classmethod
+    def from_record(cls, address: int, state: bool, dim: int, payload: memoryview):
+        level = cls()
+        level.address = address
+        level.state = state
+        level.dim = dim
+        level.payload = payload
+        return level
+
+
+class LightLevels:
+    # All records of a NodeIndexDataVector notification, decoded in one pass and
+    # stored column-wise. LightLevel objects are only built for records someone
+    # asks for.
+
+    __slots__ = ("_view", "addresses", "states", "dims")
+
+    def __init__(self, data: bytes | bytearray | memoryview):
+        view = memoryview(data)
+        view = view[: len(view) - len(view) % RECORD.size]
+        self._view = view
+
+        self.addresses: bytes = bytes(view[:: RECORD.size])
+        if view:
+            _, self.states, self.dims = zip(*RECORD.iter_unpack(view))
+        else:
+            self.states, self.dims = (), ()
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def payload(self, index: int) -> memoryview:
+        start = index * RECORD.size
+        return self._view[start + PAYLOAD_OFFSET : start + RECORD.size]
+
+    def __getitem__(self, index: int) -> LightLevel:
+        return LightLevel.from_record(
+            self.addresses[index],
+            self.states[index],
+            self.dims[index],
+            self.payload(index),
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
 
 
-def parse_lightlevels(data: bytearray):
+def parse_lightlevels(data: bytearray) -> LightLevels:
     # NodeIndexDataVector always contains exactly 10 or 20 bytes
-    return [LightLevel(data[i : i + 10]) for i in range(0, len(data), 10)]
+    return LightLevels(data)
@@ -0,0 +1,102 @@
+import math
+import time
+
+
+class LinkQuality:
+    # Estimates how long it would take to get a ready connection through a
+    # node, from its recent signal strength and earlier connection attempts.
+
+    # The connection history is kept between restarts
+    PERSISTENT = ("attempts", "successes", "latency", "failure_time")
+
+    rssi_alpha = 0.3
+    history_alpha = 0.3
+    # Seconds without advertisements before the signal is trusted less
+    stale_after = 120.0
+    # Assumed connection times until the node has been tried
+    default_latency = 2.0
+    default_failure_time = 10.0
+
+    def __init__(self):
+        self.rssi: float = None
+        self.seen_at: float = None
+        self.attempts = 0
+        self.successes = 0
+        self.latency: float = None
+        self.failure_time: float = None
+
+    def seen(self, rssi: int):
+        if self.rssi is None:
+            self.rssi = float(rssi)
+        else:
+            self.rssi += self.rssi_alpha * (rssi - self.rssi)
+        self.seen_at = time.monotonic()
+
+    def connected(self, elapsed: float):
+        self.attempts += 1
+        self.successes += 1
+        self.latency = self._average(self.latency, elapsed)
+
+    def failed(self, elapsed: float):
+        self.attempts += 1
+        self.failure_time = self._average(self.failure_time, elapsed)
+
+    def _average(self, average: float, value: float) -> float:
+        if average is None:
+            return value
+        return average + self.history_alpha * (value - average)
+
+    @property
+    def age(self) -> float:
+        if self.seen_at is None:
+            return math.inf
+        return time.monotonic() - self.seen_at
+
+    @property
+    def signal(self) -> float:
+        # 1 for a strong signal, down to 0.05 for a very weak one, and lower
+        # still for nodes which haven't been heard from in a while
+        if self.rssi is None:
+            return 0.0
+        signal = min(1.0, max(0.05, (self.rssi + 100) / 40))
+        if (age := self.age) > self.stale_after:
+            signal *= math.exp((self.stale_after - age) / self.stale_after)
+        return signal
+
+    @property
+    def success_rate(self) -> float:
+        # Starts out at 50% for nodes which haven't been tried
+        return (self.successes + 1) / (self.attempts + 2)
+
+    @property
+    def expected_time(self) -> float:
+        # Attempts until the first success follow a geometric distribution
+        p = max(self.success_rate * self.signal, 1e-3)
+        latency = self.latency if self.latency is not None else self.default_latency
+        failure_time = (
+            self.failure_time
+            if self.failure_time is not None
+            else self.default_failure_time
+        )
+        return latency + (1 - p) / p * failure_time
+
+    def state(self) -> dict:
+        return {key: getattr(self, key) for key in self.PERSISTENT}
+
+    def restore(self, state: dict):
+        for key in self.PERSISTENT:
+            if key in state:
+                setattr(self, key, state[key])
+
+    def as_dict(self) -> dict:
+        return {
+            "rssi": self.rssi,
+            "age": self.age,
+            "signal": self.signal,
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "success_rate": self.success_rate,
+            "latency": self.latency,
+            "failure_time": self.failure_time,
+            "expected_time": self.expected_time,
+        }
@@ -0,0 +1,35 @@
+import json
+import logging
+import os
+
+_LOGGER = logging.getLogger(__name__)
+
+# What was learned about the mesh in earlier runs: the gateways which worked,
+# link statistics per node and connection timings.
+# These block on file I/O, so run them in an executor.
+
+CACHE_VERSION = 1
+
+
+def read_cache(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        _LOGGER.warning("Could not read mesh cache %s: %s", path, str(e))
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+    return data
+
+
+def write_cache(path: str, data: dict):
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**data, "version": CACHE_VERSION}, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        _LOGGER.warning("Could not write mesh cache %s: %s", path, str(e))
@@ -28,7 +28,7 @@ def set_time(mesh: PlejdMesh):
     # payload = f"01 0110 001B {now_bytes.hex()} 01"
 
     payload = f"00 0110 001B {now_bytes.hex()}"
-    send_log(f"SET TIME command {hex_payload(payload)}", "TME")
+    send_log(lambda: f"SET TIME command {hex_payload(payload)}", "TME")
     return payload
     return encode(mesh, [payload])
 
@@ -38,6 +38,6 @@ def request_time(mesh: PlejdMesh, address):
     # AA 0102 001b
 
     payload = f"{address:02x} 0102 001b"
-    send_log(f"TIME REQUEST {hex_payload(payload)}", "TME")
+    send_log(lambda: f"TIME REQUEST {hex_payload(payload)}", "TME")
     return payload
     return encode(mesh, [payload])
@@ -0,0 +1,72 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # User initiated commands
+    REFRESH = 1  # Reading state from the mesh
+    HOUSEKEEPING = 2  # Keepalive, time sync, etc.
+
+
+class PriorityLock:
+    # A lock where waiters are let in by priority, and in order of arrival
+    # within the same priority. Whoever holds the lock keeps it until done,
+    # but queued background work is overtaken by interactive commands.
+
+    def __init__(self):
+        self._locked = False
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._stats = {p: {"count": 0, "wait": 0.0, "max_wait": 0.0} for p in Priority}
+
+    def locked(self) -> bool:
+        return self._locked
+
+    @property
+    def stats(self) -> dict:
+        return {p.name.lower(): dict(s) for p, s in self._stats.items()}
+
+    async def acquire(self, priority: Priority, since: float = None):
+        # since is when the caller started waiting, if earlier than now
+        if since is None:
+            since = time.monotonic()
+        if self._locked or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._order), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The lock was handed over just before cancellation
+                    self.release()
+                raise
+        self._locked = True
+
+        waited = time.monotonic() - since
+        stats = self._stats[priority]
+        stats["count"] += 1
+        stats["wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the lock directly to the next waiter
+                future.set_result(True)
+                return
+        self._locked = False
+
+    @asynccontextmanager
+    async def __call__(
+        self, priority: Priority = Priority.INTERACTIVE, since: float = None
+    ):
+        await self.acquire(priority, since)
+        try:
+            yield
+        finally:
+            self.release()
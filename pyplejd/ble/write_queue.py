@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+
+from .lastdata import LastData, HEADER
+from .scheduler import Priority
+
+# Commands which set a state of an output. A newer frame with the same
+# address, command type and command (and for OUTPUT_SET, the same mini-package
+# types) makes any pending one obsolete.
+COALESCABLE_COMMANDS = {
+    LastData.CMD_GROUP_OUTPUT_STATE,
+    LastData.CMD_GROUP_OUTPUT_STATE_AND_LEVEL,
+    LastData.CMD_OUTPUT_SET,
+    LastData.CMD_TRM_TEMPERATURE_REGULATING_SETPOINT,
+    LastData.CMD_TRM_OPERATING_MODE,
+    LastData.CMD_TRM_PWM_DUTY,
+}
+
+
+def coalesce_key(frame: bytes | bytearray | memoryview):
+    if len(frame) < HEADER.size:
+        return None
+    address, _, command_type, command = HEADER.unpack_from(frame)
+    if command not in COALESCABLE_COMMANDS or command_type == LastData.CMDT_READ:
+        return None
+    if command == LastData.CMD_OUTPUT_SET:
+        # Only a frame which sets the same fields replaces a pending one
+        types = tuple(sorted(p.type for p in LastData(frame).minipkgs))
+        return (address, command_type, command, types)
+    return (address, command_type, command)
+
+
+class PendingWrite:
+
+    __slots__ = ("frame", "futures", "queued", "issued", "priority", "coalescable")
+
+    def __init__(
+        self, frame: bytes, future: asyncio.Future, queued: float, priority: Priority
+    ):
+        self.frame = frame
+        self.futures = [future]
+        # When the first frame of this key was queued, and when this one was
+        self.queued = queued
+        self.issued = queued
+        self.priority = priority
+        self.coalescable = False
+
+    def resolve(self, result: bool):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+
+
+class WriteQueue:
+    # Frames waiting to be written to the mesh, by priority and in order.
+    # A frame which supersedes a pending one replaces it, and the callers
+    # waiting for the old frame are resolved when the new one is written.
+
+    def __init__(self):
+        self._pending: dict[Priority, dict[object, PendingWrite]] = {
+            p: {} for p in Priority
+        }
+        self._ready = asyncio.Event()
+        self._unique = itertools.count()
+        self.stats = {
+            "queued": 0,
+            "coalesced": 0,
+            "requeued": 0,
+            "expired": 0,
+            "dropped": 0,
+        }
+
+    def __len__(self):
+        return sum(len(p) for p in self._pending.values())
+
+    def put(
+        self,
+        frame: bytes | bytearray | memoryview,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        entry = PendingWrite(bytes(frame), future, time.monotonic(), priority)
+        pending = self._pending[priority]
+        self.stats["queued"] += 1
+
+        key = coalesce_key(entry.frame)
+        entry.coalescable = key is not None
+        if key is None:
+            key = next(self._unique)
+        elif (previous := pending.pop(key, None)) is not None:
+            # Keep the age of the original frame, so a continuous stream of
+            # updates can't postpone the write forever
+            entry.futures.extend(previous.futures)
+            entry.queued = previous.queued
+            self.stats["coalesced"] += 1
+
+        pending[key] = entry
+        self._ready.set()
+        return future
+
+    async def get(self, window: float = 0) -> PendingWrite:
+        # Returns the oldest ready frame of the highest priority. Frames which
+        # could be superseded are ready once they have been pending for window
+        # seconds, others right away.
+        while True:
+            now = time.monotonic()
+            wake = None
+            for pending in self._pending.values():
+                for key, entry in pending.items():
+                    if not entry.coalescable or entry.queued + window <= now:
+                        del pending[key]
+                        return entry
+                    if wake is None or entry.queued + window < wake:
+                        wake = entry.queued + window
+            self._ready.clear()
+            if wake is None:
+                await self._ready.wait()
+                continue
+            try:
+                await asyncio.wait_for(self._ready.wait(), wake - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def requeue(self, entry: PendingWrite, failed: bool = True):
+        # Put back a frame, ahead of newer frames. Only frames whose write
+        # failed count as requeued.
+        if failed:
+            self.stats["requeued"] += 1
+        pending = self._pending[entry.priority]
+        key = coalesce_key(entry.frame)
+        if key is None:
+            key = next(self._unique)
+        elif (newer := pending.get(key)) is not None:
+            # Superseded while it was being written
+            newer.futures.extend(entry.futures)
+            newer.queued = entry.queued
+            return
+        self._pending[entry.priority] = {key: entry, **pending}
+        self._ready.set()
+
+    def next_expiry(self, max_age: float) -> float | None:
+        issued = [e.issued for p in self._pending.values() for e in p.values()]
+        return min(issued) + max_age if issued else None
+
+    def expire(self, max_age: float):
+        # Drop frames issued more than max_age seconds ago
+        deadline = time.monotonic() - max_age
+        for pending in self._pending.values():
+            for key in [k for k, e in pending.items() if e.issued < deadline]:
+                pending.pop(key).resolve(False)
+                self.stats["expired"] += 1
+
+    def clear(self):
+        for pending in self._pending.values():
+            for entry in pending.values():
+                entry.resolve(False)
+            pending.clear()
+
+    def trim(self, size: int):
+        # Drop the oldest frames of the lowest priority until size are left
+        for pending in reversed(self._pending.values()):
+            while pending and len(self) > size:
+                pending.pop(next(iter(pending))).resolve(False)
+                self.stats["dropped"] += 1
+
+
+class InflightWindow:
+    # Frames written without response which the mesh has not echoed back yet.
+    # The window shrinks when echoes time out and grows again as they arrive.
+
+    def __init__(self, size: int = 0):
+        self.size = size
+        self.window = size
+        self._inflight: dict[int, deque[asyncio.TimerHandle]] = {}
+        self._count = 0
+        self._free = asyncio.Event()
+        # Set when echoes keep timing out even with a window of one frame
+        self.stalled = False
+        self.stats = {
+            "pipelined": 0,
+            "confirmed": 0,
+            "unconfirmed": 0,
+        }
+
+    def __len__(self):
+        return self._count
+
+    async def acquire(self):
+        self.window = max(1, min(self.window or self.size, self.size))
+        while self._count >= self.window:
+            self._free.clear()
+            await self._free.wait()
+
+    def sent(self, address: int, timeout: float):
+        loop = asyncio.get_running_loop()
+        handle = loop.call_later(timeout, self._timeout, address)
+        self._inflight.setdefault(address, deque()).append(handle)
+        self._count += 1
+        self.stats["pipelined"] += 1
+
+    def confirm(self, address: int):
+        if not (handles := self._inflight.get(address)):
+            return
+        handles.popleft().cancel()
+        self.stats["confirmed"] += 1
+        self.window = min(self.size, self.window + 1)
+        self._release()
+
+    def _timeout(self, address: int):
+        # Timers for the same address expire in the order they were started
+        self._inflight[address].popleft()
+        self.stats["unconfirmed"] += 1
+        if self.window <= 1:
+            self.stalled = True
+        self.window = max(1, self.window // 2)
+        self._release()
+
+    def _release(self):
+        self._count -= 1
+        self._free.set()
+
+    def clear(self):
+        for handles in self._inflight.values():
+            for handle in handles:
+                handle.cancel()
+        self._inflight = {}
+        self._count = 0
+        self._free.set()
@@ -24,15 +24,8 @@ class PlejdButton(PlejdInput):
                 if len(data.payload) == 3 and data.payload[2] == 0:
                     action = "release"
 
-                rec_log(f"BUTTON {addr=} {button=} {action=}", self.address)
+                rec_log(lambda: f"BUTTON {addr=} {button=} {action=}", self.address)
 
-                for listener in self._listeners:
-                    listener(
-                        {
-                            **self._state,
-                            "button": button,
-                            "action": action,
-                        }
-                    )
+                self._emit({"button": button, "action": action})
             case _:
                 return
@@ -1,4 +1,4 @@
-from .plejd_device import PlejdOutput, PlejdDeviceType, LightLevel
+from .plejd_device import PlejdOutput, PlejdDeviceType, LightLevels
 from ..ble import LastData, MiniPkg
 from ..ble.debug import rec_log
 
@@ -25,23 +25,27 @@ class PlejdCover(PlejdOutput):
         target = target / 0x7F * 100
 
         rec_log(
-            f"{moving=} {direction}, {position=:.1f}% {target=:.1f}% extra={"".join(f"{b:02x}" for b in payload[2:])}",
+            lambda: f"{moving=} {direction}, {position=:.1f}% {target=:.1f}% extra={bytes(payload[2:]).hex()}",
             self.address,
         )
         return {
             "position": None if lost else position,
+            "target": target,
             "moving": moving,
             "opening": direction == "up",
         }
 
-    async def parse_lightlevel(self, level: LightLevel):
-        state = self._state
-        state.update(self._parse_state(level.state, level.payload))
-        for listener in self._listeners:
-            listener(self._state)
+    def _matches(self, key, intended, reported) -> bool:
+        if key == "target":
+            # The cover reports positions with 7 bit resolution
+            return abs(intended - reported) <= 1
+        return super()._matches(key, intended, reported)
+
+    async def parse_lightlevel(self, levels: LightLevels, index: int):
+        self._update(self._parse_state(levels.states[index], levels.payload(index)))
 
     async def parse_lastdata(self, data: LastData):
-        state = self._state
+        state = {}
         if data.command in [
             LastData.CMD_OUTPUT_STATE_AND_LEVEL,
             LastData.CMD_GROUP_OUTPUT_STATE_AND_LEVEL,
@@ -66,17 +70,18 @@ class PlejdCover(PlejdOutput):
             # state["opening"] = direction == "up"
 
         elif data.command == LastData.CMD_OUTPUT_SET:
-            rec_log(f"MiniPkg:", self.address)
-            rec_log(f"{list(data.minipkgs)}", self.address)
+            rec_log("MiniPkg:", self.address)
+            rec_log(lambda: f"{list(data.minipkgs)}", self.address)
             return
         else:
             if data.address in [self.address, self.rxAddress]:
-                rec_log(f"Unknown command received: {data.command}", self.address)
-                rec_log(f"    {data.hex}", self.address)
+                rec_log(
+                    lambda: f"Unknown command received: {data.command}", self.address
+                )
+                rec_log(lambda: f"    {data.hex}", self.address)
             return
 
-        for listener in self._listeners:
-            listener(self._state)
+        self._update(state)
 
     # def parse_state(self, update, state):
     #     available = state.get("available", False)
@@ -115,13 +120,14 @@ class PlejdCover(PlejdOutput):
                         payload=[0],
                     ),
                 ],
-            ).hex
+            ).to_bytes()
         )
 
     async def set_position(self, position=None, tilt=None):
 
         if position is None and tilt is None:
             return
+        expect = {}
         payload = [
             MiniPkg(
                 type=MiniPkg.TPE_SOURCE,
@@ -132,6 +138,7 @@ class PlejdCover(PlejdOutput):
         if position is not None:
             level = int(255 * position / 100)
             level = level & 0xFF
+            expect["target"] = position
             payload.append(
                 MiniPkg(
                     type=MiniPkg.TPE_WINDOWCONTROL,
@@ -147,10 +154,11 @@ class PlejdCover(PlejdOutput):
                 )
             )
 
-        await self._mesh.write(
+        await self._command(
             LastData(
                 address=self.address,
                 command=LastData.CMD_OUTPUT_SET,
                 payload=payload,
-            ).hex
+            ),
+            expect=expect,
         )
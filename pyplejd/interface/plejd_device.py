@@ -1,8 +1,10 @@
 from __future__ import annotations
+import asyncio
+import time
 from enum import IntFlag, StrEnum
 from ..cloud import site_details as sd
 from ..ble.lastdata import LastData
-from ..ble.lightlevel import LightLevel
+from ..ble.lightlevel import LightLevels
 
 from typing import TYPE_CHECKING
 
@@ -36,7 +38,80 @@ class PlejdDeviceType(StrEnum):
     UNKNOWN = "UNKNOWN"
 
 
-class PlejdDevice:
+class PlejdStateful:
+    # Listeners are only notified when the state actually changed.
+    # If notify_window is set, changes within that many seconds are merged
+    # into a single notification.
+    notify_window: float = 0
+
+    def __init__(self):
+        self._state = {}
+        self._published = {}
+        self._notify_handle: asyncio.TimerHandle = None
+
+        self._listeners = set()
+        self._change_listeners = set()
+
+    def subscribe(self, listener, changes_only=False):
+        # Listeners get the full state, or only the changed keys if changes_only
+        listeners = self._change_listeners if changes_only else self._listeners
+        listeners.add(listener)
+        # Later updates may be suppressed as unchanged, so start the new
+        # listener off with the current state
+        if self._state:
+            listener(self._state if not changes_only else dict(self._state))
+
+        def remover():
+            if listener in listeners:
+                listeners.remove(listener)
+
+        return remover
+
+    def set_available(self, available=False):
+        self._state["available"] = available
+        self._publish()
+
+    def _publish(self, immediate=False):
+        if self.notify_window > 0 and not immediate:
+            if self._notify_handle is None:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    return self._flush()
+                self._notify_handle = loop.call_later(self.notify_window, self._flush)
+            return
+        self._flush()
+
+    def _flush(self):
+        if self._notify_handle is not None:
+            self._notify_handle.cancel()
+            self._notify_handle = None
+
+        published = self._published
+        changes = {
+            k: v
+            for k, v in self._state.items()
+            if k not in published or published[k] != v
+        }
+        if not changes:
+            return
+        self._published = dict(self._state)
+
+        for listener in self._listeners:
+            listener(self._state)
+        for listener in self._change_listeners:
+            listener(changes)
+
+    def _emit(self, event: dict):
+        # Events (button presses, scene triggers) are always delivered
+        self._flush()
+        for listener in self._listeners:
+            listener({**self._state, **event})
+        for listener in self._change_listeners:
+            listener(event)
+
+
+class PlejdDevice(PlejdStateful):
     def __init__(
         self,
         address: int,
@@ -51,6 +126,7 @@ class PlejdDevice:
         first_device: sd.Device = None,
         **__,
     ):
+        super().__init__()
         self.address = address
         self.rxAddress = rxAddress
         self.deviceAddress = deviceAddress
@@ -60,9 +136,6 @@ class PlejdDevice:
         self.roomData = room
 
         self._mesh = mesh
-        self._state = {}
-
-        self._listeners = set()
 
         self.outputType = PlejdDeviceType.UNKNOWN
         self.identifier = None
@@ -87,26 +160,12 @@ class PlejdDevice:
             return True
         return False
 
-    def subscribe(self, listener):
-        self._listeners.add(listener)
-
-        def remover():
-            if listener in self._listeners:
-                self._listeners.remove(listener)
-
-        return remover
-
-    async def parse_lightlevel(self, data: LightLevel):
+    async def parse_lightlevel(self, levels: LightLevels, index: int):
         pass
 
     async def parse_lastdata(self, data: LastData):
         pass
 
-    def set_available(self, available=False):
-        self._state["available"] = available
-        for listener in self._listeners:
-            listener(self._state)
-
     @property
     def BLEaddress(self):
         return self.deviceData.deviceId
@@ -144,12 +203,95 @@ class PlejdDevice:
 
 
 class PlejdOutput(PlejdDevice):
+    # In optimistic mode the intended state of a command is published right
+    # away with "pending" set. It's confirmed when the mesh reports the same
+    # values, or rolled back if that doesn't happen within optimistic_timeout.
+    optimistic: bool = False
+    optimistic_timeout: float = 3.0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.settings: sd.PlejdDeviceOutputSetting
         self.identifier = (self.plejdDevice.deviceId, "O", str(self.settings.output))
 
+        self._pending = {}
+        self._rollback = {}
+        self._pending_since: float = None
+        self._pending_handle: asyncio.TimerHandle = None
+        self.confirm_stats = {
+            "confirmed": 0,
+            "rolled_back": 0,
+            "latency": None,
+            "max_latency": 0.0,
+        }
+
+    def _matches(self, key, intended, reported) -> bool:
+        return intended == reported
+
+    def _update(self, reported: dict):
+        # Apply a state reported by the mesh
+        pending = self._pending
+        was_pending = bool(pending)
+        for key, value in reported.items():
+            if key in pending:
+                if not self._matches(key, pending[key], value):
+                    # Could be a stale report, keep showing the intended value
+                    self._rollback[key] = value
+                    continue
+                del pending[key]
+                self._rollback.pop(key, None)
+            self._state[key] = value
+        if was_pending and not pending:
+            self._confirmed()
+        self._publish()
+
+    def _expect(self, values: dict):
+        if not self.optimistic or not values:
+            return
+        for key in values:
+            if key not in self._pending:
+                self._rollback[key] = self._state.get(key)
+        self._pending.update(values)
+        self._pending_since = time.monotonic()
+
+        if self._pending_handle is not None:
+            self._pending_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._pending_handle = loop.call_later(self.optimistic_timeout, self._roll_back)
+
+        self._state.update(values)
+        self._state["pending"] = True
+        self._publish(immediate=True)
+
+    def _confirmed(self):
+        latency = time.monotonic() - self._pending_since
+        stats = self.confirm_stats
+        stats["confirmed"] += 1
+        stats["latency"] = latency
+        stats["max_latency"] = max(stats["max_latency"], latency)
+        self._clear_pending()
+
+    def _roll_back(self):
+        self.confirm_stats["rolled_back"] += 1
+        self._state.update(self._rollback)
+        self._clear_pending()
+        self._publish(immediate=True)
+
+    def _clear_pending(self):
+        if self._pending_handle is not None:
+            self._pending_handle.cancel()
+            self._pending_handle = None
+        self._pending = {}
+        self._rollback = {}
+        self._state["pending"] = False
+
+    async def _command(self, *commands: LastData, expect: dict = None):
+        self._expect(expect)
+        if not await self._mesh.write(*(c.to_bytes() for c in commands)):
+            if self._pending:
+                self._roll_back()
+
 
 class PlejdInput(PlejdDevice):
     def __init__(self, *args, **kwargs):
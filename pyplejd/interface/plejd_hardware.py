@@ -2,18 +2,24 @@ from ..ble import MeshDevice
 
 
 class PlejdHardware(MeshDevice):
+    # Listeners are only told about advertisements when the RSSI changed by
+    # at least this much, or when the node is seen again after going stale
+    rssi_update_threshold = 3
+
     def __init__(
         self,
         BLEaddress: str,
         powered: bool,
         blacklisted: bool = False,
     ):
+        super().__init__()
         self.BLEaddress = BLEaddress
         self._powered = powered
         self.blacklisted = blacklisted
         self.devices = set()
         self.last_seen = None
         self.rssi = None
+        self._published_rssi = None
 
         self._listeners = set()
 
@@ -21,9 +27,16 @@ class PlejdHardware(MeshDevice):
     def connectable(self):
         return self._powered and not self.blacklisted
 
+    @property
+    def link_quality(self) -> dict:
+        return self.link.as_dict()
+
     def see(self, *args, **kwargs):
+        stale = self.link.age > self.link.stale_after
         retval = super().see(*args, **kwargs)
-        self.update()
+        if stale or abs(self.rssi - self._published_rssi) >= self.rssi_update_threshold:
+            self._published_rssi = self.rssi
+            self.update()
         return retval
 
     def update(self):
@@ -1,5 +1,5 @@
 from .plejd_device import PlejdOutput, PlejdTraits, PlejdDeviceType
-from ..ble import LastData, MiniPkg, LightLevel
+from ..ble import LastData, MiniPkg, LightLevels
 from ..ble.debug import rec_log
 
 
@@ -17,19 +17,22 @@ class PlejdLight(PlejdOutput):
         ):
             self.colortemp = [ct.minTemperature, ct.maxTemperature]
 
-    async def parse_lightlevel(self, level: LightLevel):
-        state = self._state
-        state.update(
+    def _matches(self, key, intended, reported) -> bool:
+        if key == "dim" and reported is not None:
+            # Light levels report the dim level with a higher resolution
+            return abs(intended - reported) < 1
+        return super()._matches(key, intended, reported)
+
+    async def parse_lightlevel(self, levels: LightLevels, index: int):
+        self._update(
             {
-                "state": level.state,
-                "dim": level.dim / 256,
+                "state": levels.states[index],
+                "dim": levels.dims[index] / 256,
             }
         )
-        for listener in self._listeners:
-            listener(self._state)
 
     async def parse_lastdata(self, data: LastData):
-        state = self._state
+        state = {}
         match data.command:
             case LastData.CMD_GROUP_OUTPUT_STATE:
                 state["state"] = bool(data.payload[0])
@@ -45,23 +48,27 @@ class PlejdLight(PlejdOutput):
                     if p.type == MiniPkg.TPE_WHITEBALANCE:
                         state["colortemp"] = int.from_bytes(p.payload, byteorder="big")
 
-                rec_log(f"MiniPkg:", self.address)
-                rec_log(f"{list(data.minipkgs)}", self.address)
+                rec_log("MiniPkg:", self.address)
+                rec_log(lambda: f"{list(data.minipkgs)}", self.address)
             case _:
                 if data.address in [self.address, self.rxAddress]:
-                    rec_log(f"Unknown command received: {data.command}", self.address)
-                    rec_log(f"    {data.hex}", self.address)
+                    rec_log(
+                        lambda: f"Unknown command received: {data.command}",
+                        self.address,
+                    )
+                    rec_log(lambda: f"    {data.hex}", self.address)
                 return
 
-        for listener in self._listeners:
-            listener(self._state)
+        self._update(state)
 
     async def turn_on(self, dim=None, colortemp=None):
         if not self._mesh:
             return
         commands: list[LastData] = []
+        expect = {"state": True}
         if dim is not None:
             dim = int(dim)
+            expect["dim"] = dim
             commands.append(
                 LastData(
                     address=self.address,
@@ -79,6 +86,7 @@ class PlejdLight(PlejdOutput):
             )
         if colortemp is not None:
             colortemp = int(1e6 / colortemp)
+            expect["colortemp"] = colortemp
             commands.append(
                 LastData(
                     address=self.address,
@@ -96,7 +104,7 @@ class PlejdLight(PlejdOutput):
                 )
             )
 
-        await self._mesh.write(*(c.hex for c in commands))
+        await self._command(*commands, expect=expect)
 
     async def turn_off(self):
         if not self._mesh:
@@ -107,4 +115,4 @@ class PlejdLight(PlejdOutput):
             command=LastData.CMD_GROUP_OUTPUT_STATE,
             payload=[0x0],
         )
-        await self._mesh.write(cmd.hex)
+        await self._command(cmd, expect={"state": False})
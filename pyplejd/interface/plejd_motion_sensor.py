@@ -1,6 +1,6 @@
 import asyncio
 from .plejd_device import PlejdInput, PlejdDeviceType
-from ..ble import LastData, MiniPkg
+from ..ble import LastData, MiniPkg, Priority
 from ..ble.debug import rec_log
 
 
@@ -14,6 +14,7 @@ class PlejdMotionSensor(PlejdInput):
         # by the Nyquist criteria, we need our timeout to be at least
         # twice that time in order not to significantly miss any events.
         self.timeout = 75
+        self._ambient_task: asyncio.Task = None
 
     async def parse_lastdata(self, data: LastData):
         state = self._state
@@ -31,8 +32,8 @@ class PlejdMotionSensor(PlejdInput):
                     if p.type == MiniPkg.TPE_LUX:
                         state["bright"] = p.payload[0] == 2
 
-                rec_log(f"MiniPkg:", self.address)
-                rec_log(f"{list(data.minipkgs)}", self.address)
+                rec_log("MiniPkg:", self.address)
+                rec_log(lambda: f"{list(data.minipkgs)}", self.address)
 
                 # for p in data.minipkgs:
                 #     if p.type == MiniPkg.TPE_LUX:
@@ -43,23 +44,31 @@ class PlejdMotionSensor(PlejdInput):
                 #             # light
                 #             pass
 
-                cmd = LastData(
-                    address=self.address,
-                    command=LastData.CMD_AMBIENT_LIGHT_LEVEL,
-                )
-                cmd.command_type=LastData.CMDT_READ
-                rec_log(f"Write {cmd.hex}", self.address)
-                await self._mesh.write(cmd.hex)
+                # Don't hold up the notification stream waiting for the write
+                if self._ambient_task is None or self._ambient_task.done():
+                    self._ambient_task = asyncio.create_task(self._read_ambient())
             case _:
                 if data.address in [self.address, self.rxAddress]:
-                    rec_log(f"Unknown command received: {data.command}", self.address)
-                    rec_log(f"    {data.hex}", self.address)
+                    rec_log(
+                        lambda: f"Unknown command received: {data.command}",
+                        self.address,
+                    )
+                    rec_log(lambda: f"    {data.hex}", self.address)
                 return
 
-        for listener in self._listeners:
-            listener(self._state)
+        # Motion is only reported in the notification for the triggering frame
+        self._publish(immediate=True)
         self._state["motion"] = None
 
+    async def _read_ambient(self):
+        cmd = LastData(
+            address=self.address,
+            command=LastData.CMD_AMBIENT_LIGHT_LEVEL,
+        )
+        cmd.command_type = LastData.CMDT_READ
+        rec_log(lambda: f"Write {cmd.hex}", self.address)
+        await self._mesh.write(cmd.to_bytes(), priority=Priority.REFRESH)
+
     def trigger(self):
         self._state["motion"] = True
         if self.cooldown:
@@ -68,8 +77,7 @@ class PlejdMotionSensor(PlejdInput):
 
         def _callback():
             self._state["motion"] = False
-            for listener in self._listeners:
-                listener(self._state)
+            self._publish()
 
         loop = asyncio.get_running_loop()
         self.cooldown = loop.call_at(loop.time() + self.timeout, _callback).cancel
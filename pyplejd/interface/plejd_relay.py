@@ -10,21 +10,24 @@ class PlejdRelay(PlejdOutput):
         self.outputType = PlejdDeviceType.SWITCH
 
     async def parse_lastdata(self, data: LastData):
-        state = self._state
+        state = {}
         match data.command:
             case (
                 LastData.CMD_GROUP_OUTPUT_STATE
                 | LastData.CMD_GROUP_OUTPUT_STATE_AND_LEVEL
+                | LastData.CMD_OUTPUT_STATE_AND_LEVEL
             ):
                 state["state"] = bool(data.payload[0])
             case _:
                 if data.address in [self.address, self.rxAddress]:
-                    rec_log(f"Unknown command received: {data.command}", self.address)
-                    rec_log(f"    {data.hex}", self.address)
+                    rec_log(
+                        lambda: f"Unknown command received: {data.command}",
+                        self.address,
+                    )
+                    rec_log(lambda: f"    {data.hex}", self.address)
                 return
 
-        for listener in self._listeners:
-            listener(self._state)
+        self._update(state)
 
     async def turn_on(self):
         if not self._mesh:
@@ -34,7 +37,7 @@ class PlejdRelay(PlejdOutput):
             command=LastData.CMD_GROUP_OUTPUT_STATE,
             payload=[0x1],
         )
-        await self._mesh.write(cmd.hex)
+        await self._command(cmd, expect={"state": True})
 
     async def turn_off(self):
         if not self._mesh:
@@ -44,4 +47,4 @@ class PlejdRelay(PlejdOutput):
             command=LastData.CMD_GROUP_OUTPUT_STATE,
             payload=[0x0],
         )
-        await self._mesh.write(cmd.hex)
+        await self._command(cmd, expect={"state": False})
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from ..cloud import site_details as sd
-from .plejd_device import PlejdDeviceType
+from .plejd_device import PlejdDeviceType, PlejdStateful
 from ..ble import LastData
 from ..ble.debug import rec_log
 
@@ -14,20 +14,18 @@ import logging
 _LOGGER = logging.getLogger(__name__)
 
 
-class PlejdScene:
+class PlejdScene(PlejdStateful):
     def __init__(
         self,
         scene: sd.Scene,
         index: int,
         mesh: PlejdMesh,
     ):
+        super().__init__()
         self.scene = scene
         self.index = index
 
         self._mesh = mesh
-        self._state = {}
-
-        self._listeners = set()
 
         self.outputType = PlejdDeviceType.SCENE
         self.identifier = (self.scene.sceneId,)
@@ -39,18 +37,9 @@ class PlejdScene:
     def __repr__(self):
         return f"<{self.__class__.__name__} ({self.index}) {self.name}>"
 
-    def subscribe(self, listener):
-        self._listeners.add(listener)
-
-        def remover():
-            if listener in self._listeners:
-                self._listeners.remove(listener)
-
-        return remover
-
     async def activate(self):
         await self._mesh.write(
-            LastData(command=LastData.CMD_SCENE, payload=[self.index]).hex
+            LastData(command=LastData.CMD_SCENE, payload=[self.index]).to_bytes()
         )
 
     async def parse_lastdata(self, data: LastData):
@@ -59,21 +48,10 @@ class PlejdScene:
                 scene = int(data.payload[0])
                 if not scene == self.index:
                     return
-                for listener in self._listeners:
-                    listener(
-                        {
-                            **self._state,
-                            "triggered": True,
-                        }
-                    )
+                self._emit({"triggered": True})
 
         pass
 
-    def set_available(self, available=False):
-        self._state["available"] = available
-        for listener in self._listeners:
-            listener(self._state)
-
     @property
     def BLEaddress(self):
         return None
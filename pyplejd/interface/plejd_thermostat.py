@@ -1,5 +1,5 @@
 from .plejd_device import PlejdOutput, PlejdDeviceType, PlejdTraits
-from ..ble import LastData, LightLevel
+from ..ble import LastData, LightLevels
 
 
 # Modes:
@@ -76,18 +76,14 @@ class PlejdThermostat(PlejdOutput):
             "heating": heating,
         }
 
-    async def parse_lightlevel(self, level: LightLevel):
+    async def parse_lightlevel(self, levels: LightLevels, index: int):
         if self.regulation_mode == "PWM":
             return
-        state = self._state
 
-        state.update(self._parse_state(level.state, level.payload))
-
-        for listener in self._listeners:
-            listener(self._state)
+        self._update(self._parse_state(levels.states[index], levels.payload(index)))
 
     async def parse_lastdata(self, data):
-        state = self._state
+        state = {}
         match data.command:
             case (
                 LastData.CMD_OUTPUT_STATE_AND_LEVEL
@@ -99,27 +95,35 @@ class PlejdThermostat(PlejdOutput):
             case LastData.CMD_TRM_PWM_DUTY:
                 state["target"] = int(data.payload[5])
 
-        for listener in self._listeners:
-            listener(self._state)
+        self._update(state)
+
+    def _matches(self, key, intended, reported) -> bool:
+        if key == "target" and reported is not None:
+            # The state reports the setpoint in whole degrees
+            return abs(intended - reported) < 1
+        return super()._matches(key, intended, reported)
 
     async def set_target_temp(self, temp):
         if self.regulation_mode == "PWM":
             temp = int(temp)
-            await self._mesh.write(
+            await self._command(
                 LastData(
                     address=self.address,
                     command=LastData.CMD_TRM_PWM_DUTY,
                     payload=[temp & 0xFF],
-                ).hex
+                ),
+                expect={"target": temp},
             )
         else:
+            expect = {"target": temp}
             temp = int(temp * 10)
-            await self._mesh.write(
+            await self._command(
                 LastData(
                     address=self.address,
                     command=LastData.CMD_TRM_TEMPERATURE_REGULATING_SETPOINT,
                     payload=[temp & 0xFF, (temp >> 8) & 0xFF],
-                ).hex
+                ),
+                expect=expect,
             )
 
     async def turn_on(self):
@@ -128,7 +132,7 @@ class PlejdThermostat(PlejdOutput):
                 address=self.address,
                 command=LastData.CMD_TRM_OPERATING_MODE,
                 payload=[PlejdThermostat.MODE_NORMAL],
-            ).hex
+            ).to_bytes()
         )
 
     async def turn_off(self):
@@ -137,7 +141,7 @@ class PlejdThermostat(PlejdOutput):
                 address=self.address,
                 command=LastData.CMD_TRM_OPERATING_MODE,
                 payload=[PlejdThermostat.MODE_SERVICE],
-            ).hex
+            ).to_bytes()
         )
 
     async def set_mode(self, mode=None):
@@ -149,7 +153,7 @@ class PlejdThermostat(PlejdOutput):
                     address=self.address,
                     command=LastData.CMD_TRM_OPERATING_MODE,
                     payload=[PlejdThermostat.MODE_NORMAL],
-                ).hex
+                ).to_bytes()
             )
         else:
             await self._mesh.write(
@@ -157,7 +161,7 @@ class PlejdThermostat(PlejdOutput):
                     address=self.address,
                     command=LastData.CMD_TRM_OPERATING_MODE,
                     payload=[mode],
-                ).hex
+                ).to_bytes()
             )
 
     @property
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from pyplejd import PlejdManager, ConnectionError
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load_fixture(name: str):
+    with open(FIXTURES / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        await asyncio.sleep(0.005)
+
+
+@pytest.fixture
+def site():
+    return load_fixture("site.json")
+
+
+@pytest.fixture
+def make_manager(site):
+    # A manager set up from the site fixture instead of the cloud
+    async def factory(**kwargs) -> PlejdManager:
+        manager = PlejdManager("user", "password", site["site"]["siteId"], **kwargs)
+
+        async def offline():
+            raise ConnectionError
+
+        manager.cloud.get_details = offline
+        await manager.init(site)
+        return manager
+
+    return factory
+
+
+@pytest.fixture
+def fake_mesh(site, monkeypatch):
+    from fake_ble import FakeMesh
+
+    mesh = FakeMesh(site["plejdMesh"]["cryptoKey"], latency=0.01, connect_delay=0.05)
+    monkeypatch.setattr("pyplejd.ble.establish_connection", mesh.establish_connection)
+    return mesh
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from bleak import BleakError
+
+from pyplejd.ble.crypto import CipherContext
+from pyplejd.ble import ble_characteristics as gatt
+
+# A simulated mesh for establish_connection. Every connected client sees
+# what is written to any of them, like nodes in a real mesh do. Connecting
+# to a node takes delays[address] (or connect_delay) seconds, and fails for
+# nodes in failures. Addresses are written like PlejdHardware.BLEaddress.
+
+
+class FakeBLEDevice:
+    def __init__(self, address: str):
+        self.address = address
+        self.name = "P mesh"
+
+
+class FakeMesh:
+    def __init__(self, key: str, latency: float = 0.0, connect_delay: float = 0.0):
+        self.key = key
+        self.latency = latency
+        self.connect_delay = connect_delay
+        self.delays: dict[str, float] = {}
+        self.failures: set[str] = set()
+        # Every connection attempt, and every client which was connected
+        self.attempts: list[tuple[str, float]] = []
+        self.connections: list[FakeClient] = []
+        self.clients: list[FakeClient] = []
+        self.writes: list[tuple[str, bytes]] = []
+
+    async def establish_connection(
+        self, client_class, device, name, disconnected_callback=None, **kwargs
+    ):
+        address = device.address.replace(":", "").upper()
+        self.attempts.append((address, time.monotonic()))
+        await asyncio.sleep(self.delays.get(address, self.connect_delay))
+        if address in self.failures:
+            raise BleakError(f"Could not connect to {address}")
+        client = FakeClient(self, device, disconnected_callback)
+        self.connections.append(client)
+        self.clients.append(client)
+        return client
+
+    def notify_all(self, frame: bytes):
+        for client in list(self.clients):
+            client.notify(frame)
+
+
+class FakeClient:
+    def __init__(self, mesh: FakeMesh, device: FakeBLEDevice, disconnected_callback):
+        self.mesh = mesh
+        self.device = device
+        self.is_connected = True
+        self._disconnected_callback = disconnected_callback
+        self._notifiers = {}
+        self._cipher = CipherContext(mesh.key, device.address.replace(":", ""))
+        self._ping = 0
+
+    def _check(self):
+        if not self.is_connected:
+            raise BleakError("Not connected")
+
+    async def write_gatt_char(self, char, data, response=True):
+        self._check()
+        if response:
+            # Wait for the acknowledgement
+            await asyncio.sleep(self.mesh.latency)
+        if char == gatt.PLEJD_PING:
+            self._ping = data[0]
+        elif char == gatt.PLEJD_DATA:
+            frame = self._cipher.encrypt_decrypt(bytes(data))
+            self.mesh.writes.append((self.device.address, frame))
+            asyncio.get_running_loop().call_later(
+                self.mesh.latency, self.mesh.notify_all, frame
+            )
+
+    async def read_gatt_char(self, char):
+        self._check()
+        await asyncio.sleep(self.mesh.latency)
+        if char == gatt.PLEJD_PING:
+            return bytearray([(self._ping + 1) & 0xFF])
+        return bytearray(16)
+
+    async def start_notify(self, char, callback):
+        self._check()
+        self._notifiers[char] = callback
+
+    async def stop_notify(self, char):
+        self._notifiers.pop(char, None)
+
+    def notify(self, frame: bytes):
+        if callback := self._notifiers.get(gatt.PLEJD_LASTDATA):
+            callback(None, bytearray(self._cipher.encrypt_decrypt(frame)))
+
+    async def disconnect(self):
+        self.drop()
+
+    def drop(self):
+        # The link is lost
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        self.mesh.clients.remove(self)
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+
+def see_all(manager, rssi: int = -60):
+    # Advertise every node, the first one strongest
+    for i, address in enumerate(manager.hardware):
+        address = ":".join(address[j : j + 2] for j in range(0, 12, 2))
+        manager.add_mesh_device(FakeBLEDevice(address), rssi - i)
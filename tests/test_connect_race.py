@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from fake_ble import see_all
+
+# Nodes in order of advertised signal strength
+NODES = ["00000000000A", "00000000000B", "00000000000C", "00000000000D"]
+
+
+async def racing_manager(make_manager, race=3, stagger=0.1, budget=5.0):
+    manager = await make_manager()
+    mesh = manager.mesh
+    mesh.connect_race = race
+    mesh.connect_stagger = stagger
+    mesh.connect_budget = budget
+    see_all(manager)
+    return manager
+
+
+def offsets(fake_mesh, start):
+    return {address: at - start for address, at in fake_mesh.attempts}
+
+
+def test_attempts_are_staggered(make_manager, fake_mesh):
+    for address in NODES:
+        fake_mesh.delays[address] = 0.5
+
+    async def run():
+        manager = await racing_manager(make_manager)
+        start = time.monotonic()
+        connected = await manager.mesh.connect()
+        started = offsets(fake_mesh, start)
+        await manager.disconnect()
+        return connected, started
+
+    connected, started = asyncio.run(run())
+
+    assert connected
+    assert started[NODES[0]] < 0.05
+    assert 0.1 <= started[NODES[1]] < 0.15
+    assert 0.2 <= started[NODES[2]] < 0.25
+    # All slots were busy until the first attempt finished
+    assert NODES[3] not in started or started[NODES[3]] >= 0.5
+
+
+def test_failed_attempt_starts_the_next_at_once(make_manager, fake_mesh):
+    fake_mesh.failures.update(NODES[:2])
+    fake_mesh.delays.update({NODES[0]: 0.02, NODES[1]: 0.02})
+
+    async def run():
+        manager = await racing_manager(make_manager, stagger=1.0)
+        connected = await manager.mesh.connect()
+        gateway = manager.mesh._gateway_node.BLEaddress
+        stats = manager.mesh.connection_stats
+        await manager.disconnect()
+        return connected, gateway, stats
+
+    connected, gateway, stats = asyncio.run(run())
+
+    assert connected
+    assert gateway == NODES[2]
+    # Well within a single stagger delay
+    assert stats["connect_time"] < 0.5
+
+
+def test_losing_clients_are_dropped(make_manager, fake_mesh):
+    # The runner-up connects while the winner is still authenticating
+    fake_mesh.latency = 0.02
+    fake_mesh.delays.update({NODES[0]: 0.05, NODES[1]: 0.05, NODES[2]: 0.05})
+
+    async def run():
+        manager = await racing_manager(make_manager, stagger=0.02)
+        connected = await manager.mesh.connect()
+        await asyncio.sleep(0.1)
+        gateway = manager.mesh._gateway_node.BLEaddress
+        open_clients = [c.device.address for c in fake_mesh.clients]
+        connections = len(fake_mesh.connections)
+        await manager.disconnect()
+        return connected, gateway, open_clients, connections
+
+    connected, gateway, open_clients, connections = asyncio.run(run())
+
+    assert connected
+    assert connections > 1
+    assert [a.replace(":", "") for a in open_clients] == [gateway]
+
+
+def test_budget_limits_the_race(make_manager, fake_mesh):
+    fake_mesh.connect_delay = 5.0
+
+    async def run():
+        manager = await racing_manager(make_manager, budget=0.3)
+        start = time.monotonic()
+        connected = await manager.mesh.connect()
+        elapsed = time.monotonic() - start
+        open_clients = list(fake_mesh.clients)
+        await manager.disconnect()
+        return connected, elapsed, open_clients
+
+    connected, elapsed, open_clients = asyncio.run(run())
+
+    assert not connected
+    assert 0.3 <= elapsed < 0.4
+    assert open_clients == []
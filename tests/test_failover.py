@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from pyplejd import DeviceTypes as dt
+from pyplejd.ble import LastData
+
+from conftest import wait_for
+from fake_ble import see_all
+
+
+async def standby_manager(make_manager, fake_mesh):
+    manager = await make_manager()
+    mesh = manager.mesh
+    mesh.warm_standby = True
+    see_all(manager)
+    assert await manager.ping()
+    await wait_for(lambda: mesh._standby is not None)
+    return manager
+
+
+def light(manager) -> dt.PlejdLight:
+    return next(d for d in manager.devices if isinstance(d, dt.PlejdLight))
+
+
+def test_standby_promotion_keeps_devices_available(make_manager, fake_mesh):
+    async def run():
+        manager = await standby_manager(make_manager, fake_mesh)
+        mesh = manager.mesh
+        standby = mesh._standby[0]
+        changes = []
+        for device in manager.devices:
+            device.subscribe(changes.append, changes_only=True)
+        changes.clear()
+
+        start = time.monotonic()
+        mesh._client.drop()
+        await wait_for(lambda: mesh.connected)
+        elapsed = time.monotonic() - start
+
+        await light(manager).turn_on()
+        written = fake_mesh.writes[-1][0]
+        gateway = mesh._gateway_node
+        stats = mesh.connection_stats
+        changes = list(changes)
+        await manager.disconnect()
+        return standby, gateway, changes, elapsed, written, stats
+
+    standby, gateway, changes, elapsed, written, stats = asyncio.run(run())
+
+    assert gateway is standby
+    # Commands go out through the promoted standby
+    assert written.replace(":", "").upper() == standby.BLEaddress
+    assert stats["failovers"] == 1
+    assert elapsed < 0.5
+    assert not any(c.get("available") is False for c in changes)
+
+
+def test_duplicates_dropped_after_failover(make_manager, fake_mesh):
+    async def run():
+        manager = await standby_manager(make_manager, fake_mesh)
+        mesh = manager.mesh
+        received = []
+        callback = manager.lastdata_callback
+
+        async def record(data: LastData):
+            received.append(bytes(data.to_bytes()))
+            await callback(data)
+
+        manager.lastdata_callback = record
+        address = light(manager).address
+        on = bytes(LastData(address=address, command=0x97, payload=[1]).to_bytes())
+        off = bytes(LastData(address=address, command=0x97, payload=[0]).to_bytes())
+
+        fake_mesh.notify_all(on)
+        await wait_for(lambda: received)
+
+        mesh._client.drop()
+        await wait_for(lambda: mesh.connected)
+
+        # The new gateway repeats what the old one already delivered
+        fake_mesh.notify_all(on)
+        fake_mesh.notify_all(off)
+        await wait_for(lambda: len(received) > 1)
+        await asyncio.sleep(0.05)
+        stats = mesh.connection_stats
+        await manager.disconnect()
+        return received, stats, on, off
+
+    received, stats, on, off = asyncio.run(run())
+
+    assert received == [on, off]
+    assert stats["duplicates"] == 1
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from pyplejd import DeviceTypes as dt
+from pyplejd.ble import LastData
+
+from conftest import load_fixture
+
+FRAMES = load_fixture("group_frames.json")["frames"]
+
+
+def outputs(manager):
+    return {d.address: d for d in manager.devices if isinstance(d, dt.PlejdOutput)}
+
+
+@pytest.mark.parametrize("recorded", FRAMES, ids=[f["name"] for f in FRAMES])
+def test_group_frame_updates_members(make_manager, recorded):
+    async def run():
+        manager = await make_manager()
+        changes = {}
+        for address, device in outputs(manager).items():
+            device.subscribe(
+                lambda c, a=address: changes.setdefault(a, {}).update(c),
+                changes_only=True,
+            )
+
+        frame = bytes.fromhex(recorded["frame"])
+        await manager.lastdata_callback(LastData(frame))
+        return changes
+
+    changes = asyncio.run(run())
+
+    expected = {int(a): c for a, c in recorded["changes"].items()}
+    assert changes == expected
+
+
+def test_group_members_from_site(make_manager, site):
+    async def run():
+        return await make_manager()
+
+    manager = asyncio.run(run())
+    devices = outputs(manager)
+
+    for deviceId, groups in site["outputGroups"].items():
+        address = site["deviceAddress"][deviceId]
+        for group in groups["0"]:
+            assert devices[address] in manager._groups[group]
+    for roomId, room in site["roomAddress"].items():
+        members = {d.address for d in manager.room_outputs(roomId)}
+        assert {d.address for d in manager._groups[room]} == members
+
+
+def test_group_frame_skips_covers(make_manager):
+    async def run():
+        manager = await make_manager()
+        cover = outputs(manager)[14]
+        changes = []
+        cover.subscribe(changes.append, changes_only=True)
+        for recorded in FRAMES:
+            await manager.lastdata_callback(LastData(bytes.fromhex(recorded["frame"])))
+        return cover, changes
+
+    cover, changes = asyncio.run(run())
+
+    # The cover is in room 0, but its parser can't read plain on/off frames
+    assert isinstance(cover, dt.PlejdCover)
+    assert changes == []
+
+
+@pytest.mark.parametrize("recorded", FRAMES, ids=[f["name"] for f in FRAMES])
+def test_group_frame_marks_members_heard(make_manager, recorded):
+    async def run():
+        manager = await make_manager()
+        await manager.lastdata_callback(LastData(bytes.fromhex(recorded["frame"])))
+        return manager._heard
+
+    heard = asyncio.run(run())
+
+    assert set(heard) == {int(a) for a in recorded["changes"]}
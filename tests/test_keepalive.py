@@ -0,0 +1,17 @@
+import asyncio
+
+from fake_ble import see_all
+
+
+def test_reconnecting_ping_polls_once(make_manager, fake_mesh):
+    async def run():
+        manager = await make_manager()
+        see_all(manager)
+        assert await manager.ping()
+        stats = manager.mesh.keepalive_stats
+        await manager.disconnect()
+        return stats
+
+    stats = asyncio.run(run())
+
+    assert stats["polls"] == 1
@@ -0,0 +1,27 @@
+import asyncio
+
+from pyplejd import DeviceTypes as dt
+from pyplejd.ble import parse_lightlevels
+
+
+def test_lightlevel_records_update_outputs(make_manager):
+    # Light 10 on at half brightness, light 11 off, an unknown address
+    notification = bytes.fromhex(
+        "0a010000000080000000" "0b000000000000000000" "63010000000000000000"
+    )
+
+    async def run():
+        manager = await make_manager()
+        await manager.lightlevel_callback(parse_lightlevels(notification))
+        return {
+            d.address: dict(d._state)
+            for d in manager.devices
+            if isinstance(d, dt.PlejdLight)
+        }, manager._heard
+
+    states, heard = asyncio.run(run())
+
+    assert states[10] == {"state": True, "dim": 128}
+    assert states[11] == {"state": False, "dim": 0}
+    assert states[12] == {}
+    assert set(heard) == {10, 11}
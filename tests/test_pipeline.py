@@ -0,0 +1,46 @@
+import asyncio
+
+from pyplejd.ble import LastData
+
+from conftest import wait_for
+from fake_ble import see_all
+
+
+def test_echoes_confirm_while_consumer_is_busy(make_manager, fake_mesh):
+    async def run():
+        manager = await make_manager()
+        mesh = manager.mesh
+        mesh.pipeline_window = 4
+        see_all(manager)
+        assert await manager.ping()
+        await wait_for(lambda: len(mesh._inflight) == 0)
+        before = mesh.write_stats
+
+        # Hold up the notification consumer, as a slow device parser would
+        release = asyncio.Event()
+        callback = manager.lastdata_callback
+
+        async def slow(data):
+            await release.wait()
+            await callback(data)
+
+        manager.lastdata_callback = slow
+        frames = [
+            LastData(address=a, command=LastData.CMD_GROUP_OUTPUT_STATE, payload=[0])
+            for a in range(10, 16)
+        ]
+        written = await asyncio.wait_for(
+            mesh.write(*(f.to_bytes() for f in frames)), 1.0
+        )
+        await wait_for(lambda: len(mesh._inflight) == 0)
+        release.set()
+        stats = {k: v - before[k] for k, v in mesh.write_stats.items()}
+        await manager.disconnect()
+        return written, stats
+
+    written, stats = asyncio.run(run())
+
+    assert written
+    assert stats["pipelined"] == 6
+    assert stats["confirmed"] == 6
+    assert stats["unconfirmed"] == 0
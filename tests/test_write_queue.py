@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from pyplejd.ble import WRITE_HOLD
+from pyplejd.ble.lastdata import LastData, MiniPkg
+from pyplejd.ble.write_queue import WriteQueue
+
+
+def frame(address=10, command=LastData.CMD_GROUP_OUTPUT_STATE, payload=(1,)):
+    return bytes(
+        LastData(address=address, command=command, payload=list(payload)).to_bytes()
+    )
+
+
+def test_window_only_delays_coalescable_frames():
+    async def run():
+        queue = WriteQueue()
+        start = time.monotonic()
+        queue.put(frame())
+        queue.put(frame(address=0, command=LastData.CMD_EVENT_PREPARE, payload=()))
+        order = []
+        for _ in range(2):
+            entry = await queue.get(0.2)
+            order.append((entry.frame[4], time.monotonic() - start))
+        return order
+
+    (first, first_at), (second, second_at) = asyncio.run(run())
+
+    assert first == LastData.CMD_EVENT_PREPARE and first_at < 0.05
+    assert second == LastData.CMD_GROUP_OUTPUT_STATE and second_at >= 0.2
+
+
+def test_output_set_coalesces_by_fields():
+    source = MiniPkg(type=MiniPkg.TPE_SOURCE, payload=[MiniPkg.SRC_APP])
+
+    def output_set(pkg):
+        return frame(command=LastData.CMD_OUTPUT_SET, payload=[source, pkg])
+
+    async def run():
+        queue = WriteQueue()
+        queue.put(output_set(MiniPkg(type=MiniPkg.TPE_TILT, payload=[1, 2])))
+        queue.put(output_set(MiniPkg(type=MiniPkg.TPE_WINDOWCONTROL, payload=[1, 9])))
+        queue.put(output_set(MiniPkg(type=MiniPkg.TPE_WINDOWCONTROL, payload=[1, 7])))
+        return len(queue), queue.stats["coalesced"]
+
+    assert asyncio.run(run()) == (2, 1)
+
+
+def test_disconnect_stops_writer_and_fails_held_frames(make_manager, fake_mesh):
+    async def run():
+        manager = await make_manager()
+        mesh = manager.mesh
+        mesh.write_policy = WRITE_HOLD
+        held = asyncio.create_task(mesh.write(frame()))
+        await asyncio.sleep(0.01)
+        writer = mesh._write_task
+        await manager.disconnect()
+        result = await asyncio.wait_for(held, 1.0)
+        await asyncio.sleep(0)
+        return result, writer, len(mesh._writes)
+
+    result, writer, queued = asyncio.run(run())
+
+    assert result is False
+    assert writer.done()
+    assert queued == 0
+
+
+def test_held_frames_expire_without_counting_as_requeued(make_manager, fake_mesh):
+    async def run():
+        manager = await make_manager()
+        mesh = manager.mesh
+        mesh.write_policy = WRITE_HOLD
+        mesh.write_wait_timeout = 0.3
+        start = time.monotonic()
+        results = await asyncio.gather(
+            mesh.write(frame(address=10)), mesh.write(frame(address=11))
+        )
+        elapsed = time.monotonic() - start
+        stats = mesh.write_stats
+        await manager.disconnect()
+        return results, elapsed, stats
+
+    results, elapsed, stats = asyncio.run(run())
+
+    assert results == [False, False]
+    assert 0.3 <= elapsed < 0.4
+    assert stats["expired"] == 2
+    assert stats["requeued"] == 0